@@ -13,18 +13,134 @@ OPENAI_BASE_URL = os.getenv("DMX_OPENAI_BASE_URL", "https://www.dmxapi.cn/v1")
 EMBEDDING_MODEL = os.getenv("DMX_EMBED_MODEL", "text-embedding-ada-002")
 CHAT_MODEL = os.getenv("DMX_CHAT_MODEL", "gpt-4o-mini")
 
+# ---- Embedding 后端 (openai / fake / hashing / sentence_transformers) ----
+# 兼容旧开关 USE_FAKE_EMBEDDINGS=1
+EMBEDDING_BACKEND = os.getenv(
+    "EMBEDDING_BACKEND",
+    "fake" if os.getenv("USE_FAKE_EMBEDDINGS") == "1" else "openai",
+)
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "BAAI/bge-small-zh-v1.5")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+
 # ---- 数据与存储路径 ----
 PERSON_KB_PATH = os.getenv("PERSON_KB_PATH", "person_basic_info_db")
 SYSTEM_MEMORY_PATH = os.getenv("SYSTEM_MEMORY_PATH", "system_memory_db")
 REMINDER_DB_PATH = os.getenv("REMINDER_DB_PATH", "reminders.db")
 USER_PROFILE_PATH = os.getenv("USER_PROFILE_PATH", "person_basic_info/info.txt")
 
+# ---- 按用户档案 (<USER_PROFILE_DIR>/<user_id>.txt；DEFAULT_USER_ID 缺省时回退 USER_PROFILE_PATH) ----
+USER_PROFILE_DIR = os.getenv("USER_PROFILE_DIR", "user_profiles")
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "1024"))
+# 同一用户两次检查档案文件 (stat) 的最小间隔秒数
+USER_PROFILE_CHECK_INTERVAL = float(os.getenv("USER_PROFILE_CHECK_INTERVAL", "5"))
+
+# ---- 短期记忆写入策略 ----
+# selective: 例行事件只写结构化事件日志（SQLite），显著事件才 embedding；all: 全部 embedding
+MEMORY_EMBED_POLICY = os.getenv("MEMORY_EMBED_POLICY", "selective")
+MEMORY_ROUTINE_EVENT_TYPES = [
+    t.strip()
+    for t in os.getenv(
+        "MEMORY_ROUTINE_EVENT_TYPES", "routing_request,routing_result,reminder_event"
+    ).split(",")
+    if t.strip()
+]
+# 例行类型中 importance 达到该值的事件仍会 embedding（如 ignored / overdue 提醒）
+MEMORY_EMBED_MIN_IMPORTANCE = float(os.getenv("MEMORY_EMBED_MIN_IMPORTANCE", "1.5"))
+# 结构化事件日志路径；未设置时放在各 SystemMemoryManager 的 persist_path 下 (event_log.db)
+SYSTEM_EVENT_DB_PATH = os.getenv("SYSTEM_EVENT_DB_PATH")
+
+# ---- 短期记忆多进程模式 ----
+# local: 单进程，add_event 只入队，后台写线程每批（最多 64 条）embedding 后原子写一次 index.faiss / index.pkl，
+#        需要确认落盘时调用 flush()；shared: 多个 uvicorn worker 共用追加日志 + 定期快照
+SYSTEM_MEMORY_MODE = os.getenv("SYSTEM_MEMORY_MODE", "local")
+SYSTEM_MEMORY_COMPACT_EVERY = int(os.getenv("SYSTEM_MEMORY_COMPACT_EVERY", "200"))
+
+# ---- 向量索引类型 (flat / ivf / hnsw / ivfpq / fp16) ----
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+KB_INDEX_TYPE = os.getenv("KB_INDEX_TYPE", VECTOR_INDEX_TYPE)
+MEMORY_INDEX_TYPE = os.getenv("MEMORY_INDEX_TYPE", VECTOR_INDEX_TYPE)
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", "32"))
+VECTOR_INDEX_EF_SEARCH = int(os.getenv("VECTOR_INDEX_EF_SEARCH", "64"))
+VECTOR_INDEX_PQ_M = int(os.getenv("VECTOR_INDEX_PQ_M", "96"))
+# ivf / ivfpq 训练所需的最少向量数，不足时保持 flat
+VECTOR_INDEX_MIN_TRAIN = int(os.getenv("VECTOR_INDEX_MIN_TRAIN", "1024"))
+
+# ---- RAG prompt 上下文预算 ----
+# 知识片段 + 短期记忆 + 档案 + state + 模板的总 token 上限
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+RAG_PROFILE_MAX_TOKENS = int(os.getenv("RAG_PROFILE_MAX_TOKENS", "400"))
+# 检索候选数（组装时再按预算筛选）
+RAG_KNOWLEDGE_CANDIDATES = int(os.getenv("RAG_KNOWLEDGE_CANDIDATES", "6"))
+RAG_MEMORY_CANDIDATES = int(os.getenv("RAG_MEMORY_CANDIDATES", "5"))
+# 与 long_memory_storage.CHUNK_OVERLAP 一致，用于裁掉相邻片段的重叠部分
+RAG_KB_CHUNK_OVERLAP = int(os.getenv("RAG_KB_CHUNK_OVERLAP", "200"))
+# token 计数：auto（有 tiktoken 且能加载编码则精确计数）/ tiktoken / approx
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "auto")
+
+# ---- 知识库检索模式 ----
+# vector: 仅向量检索；lexical: 仅本地 BM25（不调用 embedding，无命中返回空）；hybrid: 两路 RRF 融合
+KB_RETRIEVAL_MODE = os.getenv("KB_RETRIEVAL_MODE", "vector")
+KB_LEXICAL_CANDIDATES = int(os.getenv("KB_LEXICAL_CANDIDATES", "20"))
+# 短期记忆检索：vector 时间加权向量检索（查询需 embedding）；recent 取该用户最近的显著事件（不调用 embedding）
+# 缺省时跟随知识库模式：lexical -> recent，整条检索路径不调用 embedding
+MEMORY_RETRIEVAL_MODE = os.getenv(
+    "MEMORY_RETRIEVAL_MODE", "recent" if KB_RETRIEVAL_MODE == "lexical" else "vector"
+)
+
 # ---- MQTT 相关 ----
 MQTT_BROKER = os.getenv("HEALTH_MQTT_BROKER", "broker.emqx.io")
 MQTT_PORT = int(os.getenv("HEALTH_MQTT_PORT", "1883"))
 SENSOR_TOPIC = os.getenv("HEALTH_SENSOR_TOPIC", "ierg6200/health/monitor1")
 REMINDER_TOPIC = os.getenv("REMINDER_TOPIC", "ierg6200/health/reminders")
 LLM_OUTPUT_TOPIC = os.getenv("LLM_OUTPUT_TOPIC", "ierg6200/health/llmoutput")
+# paho: 真实 Broker；local: 进程内 Broker 替身（离线压测/基准）
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "paho")
+LOCAL_BROKER_QUEUE_SIZE = int(os.getenv("LOCAL_BROKER_QUEUE_SIZE", "10000"))
+# 传感器摄入：有界队列 + 工作线程池；溢出策略 drop_oldest / keep_latest（队列满时同一设备只留最新一条）
+SENSOR_QUEUE_SIZE = int(os.getenv("SENSOR_QUEUE_SIZE", "1000"))
+SENSOR_QUEUE_POLICY = os.getenv("SENSOR_QUEUE_POLICY", "drop_oldest")
+SENSOR_WORKERS = int(os.getenv("SENSOR_WORKERS", "2"))
+# 提醒推送合并：同一用户窗口内的事件合成一条 batch 消息（毫秒，0 逐条立即发送）
+REMINDER_BATCH_WINDOW_MS = float(os.getenv("REMINDER_BATCH_WINDOW_MS", "200"))
+REMINDER_BATCH_MAX = int(os.getenv("REMINDER_BATCH_MAX", "50"))
+
+# ---- 提醒读缓存 (TTL 秒，0 关闭；多进程部署时为跨进程最大陈旧时间) ----
+REMINDER_CACHE_TTL = float(os.getenv("REMINDER_CACHE_TTL", "30"))
+REMINDER_CACHE_SIZE = int(os.getenv("REMINDER_CACHE_SIZE", "10000"))
+
+# ---- 监控埋点 (/metrics) ----
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# ---- 请求剖析 (X-Profile 头 / ?profile=1 / 按比例采样) ----
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# 是否允许客户端用 X-Profile 头 / ?profile=1 触发剖析（会运行 cProfile 并写盘，默认关闭）
+PROFILE_ALLOW_REQUEST_FLAG = os.getenv("PROFILE_ALLOW_REQUEST_FLAG", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+
+# ---- /api/watch_state 结果缓存 (秒，0 关闭)：state 未变化时复用上次 payload ----
+WATCH_STATE_CACHE_TTL = float(os.getenv("WATCH_STATE_CACHE_TTL", "300"))
+
+# ---- 关怀宏冷却窗口 (分钟)：窗口内重复触发复用未完成的提醒 ----
+MACRO_COOLDOWN_MINUTES = float(os.getenv("MACRO_COOLDOWN_MINUTES", "120"))
+
+# ---- 生命体征时序存储 (raw -> 1 分钟 -> 1 小时 三层降采样) ----
+VITALS_DB_PATH = os.getenv("VITALS_DB_PATH", "vitals.db")
+VITALS_FLUSH_INTERVAL = float(os.getenv("VITALS_FLUSH_INTERVAL", "1.0"))
+VITALS_BATCH_SIZE = int(os.getenv("VITALS_BATCH_SIZE", "500"))
+VITALS_RAW_RETENTION_HOURS = float(os.getenv("VITALS_RAW_RETENTION_HOURS", "48"))
+VITALS_1M_RETENTION_DAYS = float(os.getenv("VITALS_1M_RETENTION_DAYS", "30"))
+VITALS_1H_RETENTION_DAYS = float(os.getenv("VITALS_1H_RETENTION_DAYS", "365"))
+
+# ---- 天文台天气 (一次请求得到全港各站数据，所有用户共用；按档案位置取最近站点) ----
+HKO_WEATHER_TTL = float(os.getenv("HKO_WEATHER_TTL", "120"))
+HKO_DEFAULT_STATION = os.getenv("HKO_DEFAULT_STATION", "Hong Kong Observatory")
+
+# ---- JSON 序列化 (auto: 安装了 orjson 则使用；json: 强制标准库) ----
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto")
 
 # ---- 其它 ----
 DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID", "user_001")
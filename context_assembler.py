@@ -0,0 +1,219 @@
+"""
+RAG prompt 的上下文组装：在固定 token 预算内挑选知识片段与短期记忆。
+
+- 当前状态 (state JSON) 总是保留；用户档案按行截断到 RAG_PROFILE_MAX_TOKENS；
+- 剩余预算按得分从高到低填入知识片段与短期记忆（得分 = 各自检索结果中的名次倒数，
+  两类交替竞争），放不下的候选跳过，继续尝试更小的；
+- 去重：内容相同或被已选片段包含的候选直接丢弃；知识库切分时相邻片段有
+  CHUNK_OVERLAP 字符重叠，与已选片段首尾重叠的部分会被裁掉，只保留新增内容；
+- 每次组装给出 prompt 规模报告（各部分 token 数、丢弃 / 去重数量），并记录到
+  /metrics 的 rag_prompt_tokens 直方图。
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from config import (
+    METRICS_ENABLED,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_KB_CHUNK_OVERLAP,
+    RAG_PROFILE_MAX_TOKENS,
+)
+from metrics import registry
+from serialization import dumps
+from token_counter import count_tokens, stored_or_count, tokenizer_name
+
+TOKEN_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000)
+# 首尾重叠至少这么多字符才裁剪，避免把偶然相同的短语当成重叠
+MIN_OVERLAP_CHARS = 20
+
+_prompt_tokens = registry.histogram(
+    "rag_prompt_tokens", "RAG prompt 估算 token 数（按部分）", buckets=TOKEN_BUCKETS
+)
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _suffix_prefix_overlap(left: str, right: str, max_overlap: int) -> int:
+    """left 的结尾与 right 的开头相同的最大长度（不超过 max_overlap，不足 MIN_OVERLAP_CHARS 视为 0）。"""
+    if len(left) < MIN_OVERLAP_CHARS or len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    tail = left[-max_overlap:]
+    probe = right[:MIN_OVERLAP_CHARS]
+    idx = tail.find(probe)
+    while idx >= 0:
+        if right.startswith(tail[idx:]):
+            return len(tail) - idx
+        idx = tail.find(probe, idx + 1)
+    return 0
+
+
+@dataclass
+class _Candidate:
+    section: str
+    rank: int
+    doc: Document
+    text: str
+    score: float
+
+
+@dataclass
+class AssembledContext:
+    state: str
+    knowledge: List[str]
+    short_term: List[str]
+    profile: Optional[str]
+    report: Dict[str, Any] = field(default_factory=dict)
+
+    def prompt_vars(self) -> Dict[str, str]:
+        return {
+            "state": self.state,
+            "knowledge": "\n".join(self.knowledge) or "无",
+            "short_term": "\n".join(self.short_term) or "无",
+            "profile": self.profile or "无",
+        }
+
+
+class ContextAssembler:
+    def __init__(
+        self,
+        budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+        profile_max_tokens: int = RAG_PROFILE_MAX_TOKENS,
+        overhead_tokens: int = 0,
+        max_overlap: int = RAG_KB_CHUNK_OVERLAP,
+    ):
+        self.budget = budget
+        self.profile_max_tokens = profile_max_tokens
+        # prompt 模板本身（system 指令 + 字段标题）的 token 数
+        self.overhead_tokens = overhead_tokens
+        self.max_overlap = max_overlap
+
+    # ------------------------------------------------------------------
+    # 各部分
+    # ------------------------------------------------------------------
+    def _truncate_profile(self, profile: Optional[str]) -> Tuple[Optional[str], int, bool]:
+        if not profile:
+            return None, 0, False
+        tokens = count_tokens(profile)
+        if tokens <= self.profile_max_tokens:
+            return profile, tokens, False
+        # 档案开头是姓名 / 年龄 / 基本情况等关键字段，按行保留前面的内容
+        kept: List[str] = []
+        used = 0
+        for line in profile.splitlines():
+            line_tokens = count_tokens(line) + 1
+            if used + line_tokens > self.profile_max_tokens:
+                break
+            kept.append(line)
+            used += line_tokens
+        return "\n".join(kept), used, True
+
+    def _dedupe(self, candidate: _Candidate, selected: List[_Candidate]) -> Optional[str]:
+        """返回去重 / 裁掉重叠后的文本；完全重复时返回 None。"""
+        text = candidate.text
+        normalized = _normalize(text)
+        for other in selected:
+            other_normalized = _normalize(other.text)
+            if normalized in other_normalized:
+                return None
+            if candidate.section != "knowledge" or other.section != "knowledge":
+                continue
+            head = _suffix_prefix_overlap(other.text, text, self.max_overlap)
+            if head:
+                text = text[head:]
+            tail = _suffix_prefix_overlap(text, other.text, self.max_overlap)
+            if tail:
+                text = text[:-tail]
+        return text if text.strip() else None
+
+    # ------------------------------------------------------------------
+    # 组装
+    # ------------------------------------------------------------------
+    def assemble(
+        self,
+        state: Dict[str, Any],
+        knowledge: Sequence[Document],
+        short_term: Sequence[Document],
+        profile: Optional[str],
+    ) -> AssembledContext:
+        state_text = dumps(state)
+        state_tokens = count_tokens(state_text)
+        profile_text, profile_tokens, profile_truncated = self._truncate_profile(profile)
+        remaining = self.budget - self.overhead_tokens - state_tokens - profile_tokens
+
+        candidates = [
+            _Candidate("knowledge", rank, doc, doc.page_content, 1.0 / (rank + 1))
+            for rank, doc in enumerate(knowledge)
+        ] + [
+            _Candidate("short_term", rank, doc, doc.page_content, 1.0 / (rank + 1))
+            for rank, doc in enumerate(short_term)
+        ]
+        # 同分时知识片段优先（sorted 稳定）
+        candidates.sort(key=lambda c: -c.score)
+
+        selected: List[_Candidate] = []
+        section_tokens = {"knowledge": 0, "short_term": 0}
+        dropped = {"knowledge": 0, "short_term": 0}
+        deduped = 0
+        trimmed = 0
+        for candidate in candidates:
+            text = self._dedupe(candidate, selected)
+            if text is None:
+                deduped += 1
+                continue
+            was_trimmed = text != candidate.text
+            if was_trimmed:
+                tokens = count_tokens(text)
+            else:
+                tokens = stored_or_count(candidate.doc.metadata, text)
+            if tokens > remaining:
+                dropped[candidate.section] += 1
+                continue
+            trimmed += was_trimmed
+            candidate.text = text
+            selected.append(candidate)
+            section_tokens[candidate.section] += tokens
+            remaining -= tokens
+
+        # 输出时恢复各部分内的检索名次顺序
+        by_rank = sorted(selected, key=lambda c: (c.section, c.rank))
+        sections = {
+            "overhead": self.overhead_tokens,
+            "state": state_tokens,
+            "profile": profile_tokens,
+            **section_tokens,
+        }
+        prompt_tokens = sum(sections.values())
+        report = {
+            "tokenizer": tokenizer_name(),
+            "budget": self.budget,
+            "prompt_tokens": prompt_tokens,
+            "over_budget": prompt_tokens > self.budget,
+            "sections": sections,
+            "selected": {s: sum(1 for c in selected if c.section == s) for s in dropped},
+            "dropped": dropped,
+            "deduped": deduped,
+            "trimmed_overlap": trimmed,
+            "profile_truncated": profile_truncated,
+        }
+        if METRICS_ENABLED:
+            _prompt_tokens.observe(prompt_tokens, section="total")
+            for section, tokens in sections.items():
+                _prompt_tokens.observe(tokens, section=section)
+
+        return AssembledContext(
+            state=state_text,
+            knowledge=[c.text for c in by_rank if c.section == "knowledge"],
+            short_term=[c.text for c in by_rank if c.section == "short_term"],
+            profile=profile_text,
+            report=report,
+        )
@@ -0,0 +1,211 @@
+"""
+Embedding 后端统一入口，由 config.EMBEDDING_BACKEND 选择:
+
+- openai: 远端 OpenAI 兼容接口（默认）；
+- fake: LangChain FakeEmbeddings，随机向量，仅用于联调；
+- hashing: 本地确定性哈希特征（词 + 中文字符 bigram + 字符 trigram），纯 CPU、无需网络与模型文件；
+- sentence_transformers: 本地小模型 (config.LOCAL_EMBED_MODEL)，需额外安装 sentence-transformers。
+
+本地后端统一经过 BatchedEmbeddings 分批并在线程池中并行计算。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DIM,
+    EMBEDDING_MODEL,
+    EMBEDDING_WORKERS,
+    LOCAL_EMBED_MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+)
+from lexical_index import tokenize
+
+EMBEDDING_BACKENDS = ("openai", "fake", "hashing", "sentence_transformers")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    确定性哈希特征向量：特征经 blake2b 映射到固定维度并带符号，按 log(1+tf) 加权后 L2 归一化。
+    相同文本在任意进程中得到相同向量，可与 FAISS 持久化索引长期配合使用。
+    """
+
+    def __init__(self, size: int = EMBEDDING_DIM):
+        self.size = size
+
+    def _features(self, text: str) -> Counter:
+        features = Counter(tokenize(text))
+        lowered = text.lower()
+        for word in lowered.split():
+            padded = f"#{word}#"
+            features.update(f"3:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature, tf in self._features(text).items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.size] += sign * math.log1p(tf)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class BatchedEmbeddings(Embeddings):
+    """为本地后端增加分批与线程池执行；查询向量直接在调用线程计算，避免排队。"""
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        *,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        workers: int = EMBEDDING_WORKERS,
+    ):
+        self.inner = inner
+        self.batch_size = max(1, batch_size)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="embedding"
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= self.batch_size:
+            return self.inner.embed_documents(texts)
+        batches = [
+            texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)
+        ]
+        results: List[List[float]] = []
+        for vectors in self.executor.map(self.inner.embed_documents, batches):
+            results.extend(vectors)
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+
+def _create(backend: str) -> Embeddings:
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(
+            base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL
+        )
+    if backend == "fake":
+        from langchain_community.embeddings import FakeEmbeddings
+
+        return FakeEmbeddings(size=EMBEDDING_DIM)
+    if backend == "hashing":
+        return BatchedEmbeddings(HashingEmbeddings(size=EMBEDDING_DIM))
+    if backend == "sentence_transformers":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return BatchedEmbeddings(
+            HuggingFaceEmbeddings(
+                model_name=LOCAL_EMBED_MODEL,
+                encode_kwargs={"normalize_embeddings": True},
+            )
+        )
+    raise ValueError(f"未知 embedding 后端: {backend}，可选 {EMBEDDING_BACKENDS}")
+
+
+_instances: Dict[str, Embeddings] = {}
+_lock = threading.Lock()
+
+
+def get_embeddings(backend: Optional[str] = None) -> Embeddings:
+    """按后端名返回进程内共享的 Embeddings 实例。"""
+    backend = backend or EMBEDDING_BACKEND
+    with _lock:
+        if backend not in _instances:
+            _instances[backend] = _create(backend)
+        return _instances[backend]
+
+
+def embedding_signature(backend: Optional[str] = None) -> str:
+    """标识向量空间；签名不同的向量不可混存于同一索引。"""
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "openai":
+        return f"openai:{EMBEDDING_MODEL}"
+    if backend == "sentence_transformers":
+        return f"sentence_transformers:{LOCAL_EMBED_MODEL}"
+    return f"{backend}:{EMBEDDING_DIM}"
+
+
+# ------------------------------------------------------------------
+# 索引元数据：记录生成向量的 embedding 签名与维度
+# ------------------------------------------------------------------
+INDEX_META_FILE = "embedding.json"
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """已有向量索引与当前 embedding 后端 / 维度不一致。"""
+
+
+def signature_of(embeddings: Optional[Embeddings]) -> str:
+    """embeddings 为配置的共享实例（或 None）时即 embedding_signature()，自定义实例按类名 + 模型标识。"""
+    if embeddings is None or embeddings is _instances.get(EMBEDDING_BACKEND):
+        return embedding_signature()
+    inner = getattr(embeddings, "inner", embeddings)
+    model = (
+        getattr(inner, "model", None)
+        or getattr(inner, "model_name", None)
+        or getattr(inner, "size", None)
+    )
+    return f"{type(inner).__module__}.{type(inner).__qualname__}:{model}"
+
+
+def write_index_meta(folder_path: str, signature: str, dim: int) -> None:
+    os.makedirs(folder_path, exist_ok=True)
+    path = os.path.join(folder_path, INDEX_META_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "dim": int(dim)}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def read_index_meta(folder_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(folder_path, INDEX_META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def index_mismatch(folder_path: str, index_dim: int, embeddings: Embeddings) -> Optional[str]:
+    """
+    检查 folder_path 下的索引能否与 embeddings 配合使用，不一致时返回原因，一致返回 None。
+    旧版索引没有元数据文件时，用一次查询 embedding 探测当前维度（无法区分同维度的不同模型）。
+    """
+    signature = signature_of(embeddings)
+    meta = read_index_meta(folder_path)
+    if meta is not None:
+        if meta.get("signature") != signature:
+            return f"索引由 {meta.get('signature')} 生成，当前为 {signature}"
+        if meta.get("dim") != index_dim:
+            return f"索引维度 {index_dim} 与记录的 {meta.get('dim')} 不符"
+        return None
+    dim = len(embeddings.embed_query("dimension probe"))
+    if dim != index_dim:
+        return f"索引维度 {index_dim}，当前 embedding ({signature}) 维度 {dim}"
+    return None
@@ -0,0 +1,170 @@
+"""
+短期记忆的结构化事件日志（SQLite）。
+
+所有 add_event 事件都会追加到这里（按用户 / 类型 / 时间可查），
+只有 SystemMemoryManager 判定为“显著”的事件才额外 embedding 进 FAISS。
+例行事件（routing_request / routing_result / 提醒 created、triggered 等）只写本日志，
+省去 embedding 调用与向量索引插入。
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from serialization import dumps, loads
+
+TimeLike = Union[datetime, float, int, None]
+
+
+def _epoch(value: Union[TimeLike, str]) -> Optional[float]:
+    """datetime / ISO 字符串 / epoch 秒 -> epoch 秒；无时区的时间按 UTC（与 datetime.utcnow() 一致）。"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class StructuredEventLog:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        # 每个线程一个连接（写线程与查询线程各自复用）
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        with conn:
+            # WAL：多进程（shared 模式）并发写入与读取互不阻塞
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS memory_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    importance REAL DEFAULT 1.0,
+                    embedded INTEGER DEFAULT 0,
+                    metadata TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_memory_events_user_type_time
+                ON memory_events (user_id, event_type, created_at)
+                """
+            )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_memory_events_user_time
+                ON memory_events (user_id, created_at)
+                """
+            )
+
+    def append_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """
+        批量追加，单个事务。每条事件:
+        {"user_id", "event_type", "content", "importance", "embedded", "metadata", "created_at"}
+        """
+        rows = [
+            (
+                e["user_id"],
+                e["event_type"],
+                e["content"],
+                e.get("importance", 1.0),
+                1 if e.get("embedded") else 0,
+                dumps(e.get("metadata") or {}),
+                _epoch(e.get("created_at")) or time.time(),
+            )
+            for e in events
+        ]
+        if not rows:
+            return 0
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO memory_events
+                    (user_id, event_type, content, importance, embedded, metadata, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def query(
+        self,
+        *,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since: TimeLike = None,
+        until: TimeLike = None,
+        embedded: Optional[bool] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """按用户 / 类型 / 时间范围（及是否 embedding）查询，按时间倒序返回最近的 limit 条。"""
+        query = "SELECT * FROM memory_events WHERE 1=1"
+        params: List[Any] = []
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if event_type:
+            query += " AND event_type = ?"
+            params.append(event_type)
+        if since is not None:
+            query += " AND created_at >= ?"
+            params.append(_epoch(since))
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(_epoch(until))
+        if embedded is not None:
+            query += " AND embedded = ?"
+            params.append(1 if embedded else 0)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        rows = self._connection().execute(query, params).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "user_id": row["user_id"],
+                "event_type": row["event_type"],
+                "content": row["content"],
+                "importance": row["importance"],
+                "embedded": bool(row["embedded"]),
+                "metadata": loads(row["metadata"] or "{}"),
+                "created_at": datetime.utcfromtimestamp(row["created_at"]).isoformat(),
+            }
+            for row in rows
+        ]
+
+    def embedded_events(self) -> List[Dict[str, Any]]:
+        """所有曾 embedding 进 FAISS 的事件（按写入顺序），用于更换 embedding 后重建向量索引。"""
+        rows = self._connection().execute(
+            "SELECT content, metadata FROM memory_events WHERE embedded = 1 ORDER BY id"
+        ).fetchall()
+        return [
+            {"content": row["content"], "metadata": loads(row["metadata"] or "{}")}
+            for row in rows
+        ]
@@ -1,6 +1,17 @@
-import requests
 import logging
-from typing import Tuple, List, Optional
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from config import HKO_DEFAULT_STATION, HKO_WEATHER_TTL
+from metrics import inc
+from user_profiles import get_profile_store
 
 # ==========================================
 # 1. 配置独立日志 (不使用 basicConfig)
@@ -58,65 +69,233 @@ class HKOWarningCode:
     LANDSLIP     = "WL"
     TSUNAMI      = "WTMW"
 
+# 自动气象站坐标（rhrread 温度 / 湿度的 place 名称，纬度, 经度；近似值，仅用于找最近站点）
+STATION_COORDS: Dict[str, Tuple[float, float]] = {
+    "Hong Kong Observatory": (22.3019, 114.1742),
+    "King's Park": (22.3119, 114.1728),
+    "Wong Chuk Hang": (22.2478, 114.1736),
+    "Ta Kwu Ling": (22.5286, 114.1567),
+    "Lau Fau Shan": (22.4689, 113.9836),
+    "Tai Po": (22.4461, 114.1790),
+    "Sha Tin": (22.4025, 114.2100),
+    "Tuen Mun": (22.3858, 113.9642),
+    "Tseung Kwan O": (22.3158, 114.2556),
+    "Sai Kung": (22.3756, 114.2744),
+    "Cheung Chau": (22.2011, 114.0267),
+    "Chek Lap Kok": (22.3094, 113.9219),
+    "Tsing Yi": (22.3442, 114.1100),
+    "Shek Kong": (22.4361, 114.0847),
+    "Tsuen Wan Ho Koon": (22.3836, 114.1078),
+    "Tsuen Wan Shing Mun Valley": (22.3756, 114.1267),
+    "Hong Kong Park": (22.2783, 114.1622),
+    "Shau Kei Wan": (22.2817, 114.2361),
+    "Kowloon City": (22.3353, 114.1847),
+    "Happy Valley": (22.2703, 114.1836),
+    "Wong Tai Sin": (22.3394, 114.2053),
+    "Stanley": (22.2142, 114.2197),
+    "Kwun Tong": (22.3186, 114.2247),
+    "Sham Shui Po": (22.3358, 114.1369),
+    "Kai Tak Runway Park": (22.3047, 114.2169),
+    "Yuen Long Park": (22.4483, 114.0186),
+    "Tai Mei Tuk": (22.4753, 114.2375),
+}
+
+# 十八区大致中心（rhrread 雨量的 place 名称）
+DISTRICT_COORDS: Dict[str, Tuple[float, float]] = {
+    "Central & Western District": (22.2820, 114.1450),
+    "Wan Chai": (22.2790, 114.1730),
+    "Eastern District": (22.2730, 114.2300),
+    "Southern District": (22.2460, 114.1700),
+    "Yau Tsim Mong": (22.3110, 114.1700),
+    "Sham Shui Po": (22.3300, 114.1620),
+    "Kowloon City": (22.3280, 114.1910),
+    "Wong Tai Sin": (22.3420, 114.1950),
+    "Kwun Tong": (22.3130, 114.2260),
+    "Kwai Tsing": (22.3550, 114.1080),
+    "Tsuen Wan": (22.3720, 114.1140),
+    "Tuen Mun": (22.3910, 113.9730),
+    "Yuen Long": (22.4450, 114.0220),
+    "North District": (22.4940, 114.1380),
+    "Tai Po": (22.4500, 114.1690),
+    "Sha Tin": (22.3870, 114.1950),
+    "Sai Kung": (22.3810, 114.2700),
+    "Islands District": (22.2620, 113.9460),
+}
+
+_COORDS_RE = re.compile(r"(-?\d+(?:\.\d+)?)\s*[,，\s]\s*(-?\d+(?:\.\d+)?)")
+# 抓取失败时，多久后重试（秒）；期间继续使用上一份快照
+_RETRY_AFTER_ERROR = 30.0
+
+BASE_URL = "https://data.weather.gov.hk/weatherAPI/opendata/weather.php"
+
+
 # ==========================================
-# 3. 获取数据的函数
+# 3. 全港快照与按用户取值
 # ==========================================
-def get_hko_weather() -> Tuple[Optional[float], Optional[int], List[str]]:
-    """
-    获取香港天气数据
-    :return: (温度, 湿度, 警告代码列表)
-    """
-    base_url = "https://data.weather.gov.hk/weatherAPI/opendata/weather.php"
-    
+@dataclass(frozen=True)
+class UserLocation:
+    """用户位置：档案中的“坐标：22.38, 114.19”、“气象站：Sha Tin”、“地区：Sha Tin”字段。"""
+
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    station: Optional[str] = None
+    district: Optional[str] = None
+
+
+@dataclass
+class UserWeather:
+    temperature: Optional[float]
+    humidity: Optional[int]
+    warnings: List[str]
+    station: Optional[str] = None
+    district: Optional[str] = None
+    rainfall: Optional[float] = None  # 所在地区过去一小时最大雨量 (mm)
+    # 湿度站点较少（通常只有天文台总部），与温度站点不同时单独注明
+    humidity_station: Optional[str] = None
+
+    def as_tuple(self) -> Tuple[Optional[float], Optional[int], List[str]]:
+        return self.temperature, self.humidity, list(self.warnings)
+
+
+@dataclass
+class WeatherSnapshot:
+    """一次 rhrread + warnsum 请求解析出的全港数据，按站点 / 地区索引。"""
+
+    temperature: Dict[str, float] = field(default_factory=dict)
+    humidity: Dict[str, int] = field(default_factory=dict)
+    rainfall: Dict[str, float] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+    update_time: Optional[str] = None
+    fetched_at: float = 0.0
+    ok: bool = False
+
+    def for_location(self, location: UserLocation) -> UserWeather:
+        position = _position(location)
+        station, temperature = _pick(self.temperature, "station", position, location.station)
+        # 湿度优先取温度所用站点，没有数据时取最近的有湿度数据的站点
+        humidity_station, humidity = _pick(self.humidity, "station", position, station or location.station)
+        district, rainfall = _pick(self.rainfall, "district", position, location.district)
+        return UserWeather(
+            temperature=temperature,
+            humidity=humidity,
+            warnings=list(self.warnings),
+            station=station,
+            district=district,
+            rainfall=rainfall,
+            humidity_station=humidity_station,
+        )
+
+
+def _distance_sq(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # 全港范围很小，按纬度修正经度后的平面距离足以排序
+    dx = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    dy = lat2 - lat1
+    return dx * dx + dy * dy
+
+
+@lru_cache(maxsize=4096)
+def _nearest(lat: float, lon: float, table: str) -> Tuple[str, ...]:
+    """按距离排序的站点 / 地区名（同一坐标只排序一次）。"""
+    coords = STATION_COORDS if table == "station" else DISTRICT_COORDS
+    return tuple(sorted(coords, key=lambda name: _distance_sq(lat, lon, *coords[name])))
+
+
+def _position(location: UserLocation) -> Tuple[Optional[float], Optional[float]]:
+    """用于找最近站点的位置：坐标 -> 指定气象站的坐标 -> 默认站点的坐标。"""
+    if location.lat is not None and location.lon is not None:
+        return location.lat, location.lon
+    if location.station in STATION_COORDS:
+        return STATION_COORDS[location.station]
+    return STATION_COORDS.get(HKO_DEFAULT_STATION, (None, None))
+
+
+def _pick(
+    values: Dict[str, Any],
+    table: str,
+    position: Tuple[Optional[float], Optional[float]],
+    preferred: Optional[str],
+):
+    """指定名称 -> 离 position 最近的有数据站点 / 地区 -> 默认站点 -> 任一站点。"""
+    if not values:
+        return None, None
+    if preferred in values:
+        return preferred, values[preferred]
+    lat, lon = position
+    if lat is not None and lon is not None:
+        for name in _nearest(lat, lon, table):
+            if name in values:
+                return name, values[name]
+    if HKO_DEFAULT_STATION in values:
+        return HKO_DEFAULT_STATION, values[HKO_DEFAULT_STATION]
+    name = next(iter(values))
+    return name, values[name]
+
+
+def parse_rhrread(data: Dict[str, Any]) -> Dict[str, Any]:
+    """把 rhrread 响应解析为 {temperature, humidity, rainfall, update_time}，坏数据逐条跳过。"""
+    temperature: Dict[str, float] = {}
+    for item in (data.get("temperature") or {}).get("data", []):
+        try:
+            temperature[item["place"]] = float(item["value"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ 温度数据解析错误: {item}")
+
+    humidity: Dict[str, int] = {}
+    for item in (data.get("humidity") or {}).get("data", []):
+        try:
+            humidity[item["place"]] = int(item["value"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ 湿度数据解析错误: {item}")
+
+    rainfall: Dict[str, float] = {}
+    for item in (data.get("rainfall") or {}).get("data", []):
+        try:
+            rainfall[item["place"]] = float(item.get("max", 0) or 0)
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ 雨量数据解析错误: {item}")
+
+    return {
+        "temperature": temperature,
+        "humidity": humidity,
+        "rainfall": rainfall,
+        "update_time": data.get("updateTime"),
+    }
+
+
+def fetch_snapshot() -> WeatherSnapshot:
+    """请求一次实时天气与警告摘要，解析为全港快照；任一请求失败时 ok=False。"""
     session = requests.Session()
     session.trust_env = False
-
-    temp_val = None
-    humidity_val = None
-    warning_codes = []
+    snapshot = WeatherSnapshot(fetched_at=time.time())
+    weather_ok = warn_ok = False
 
     try:
-        # logger.info("正在请求数据...") 
-        
         # --- 1. 获取实时天气 ---
-        resp_weather = session.get(base_url, params={"dataType": "rhrread", "lang": "en"}, timeout=5)
-        
+        resp_weather = session.get(BASE_URL, params={"dataType": "rhrread", "lang": "en"}, timeout=5)
+
         if resp_weather.status_code == 200:
-            w_data = resp_weather.json()
-            
-            # 温度
-            temps = w_data.get("temperature", {}).get("data", [])
-            if temps:
-                hko_temp = next((item for item in temps if item["place"] == "Hong Kong Observatory"), temps[0])
-                try:
-                    temp_val = float(hko_temp["value"])
-                except (ValueError, KeyError):
-                    logger.warning(f"⚠️ 温度数据解析错误: {hko_temp}")
-                    temp_val = None
-            
-            # 湿度
-            hums = w_data.get("humidity", {}).get("data", [])
-            if hums:
-                try:
-                    humidity_val = int(hums[0]["value"])
-                except (ValueError, KeyError):
-                    logger.warning("⚠️ 湿度数据解析错误")
-                    humidity_val = None
+            parsed = parse_rhrread(resp_weather.json())
+            snapshot.temperature = parsed["temperature"]
+            snapshot.humidity = parsed["humidity"]
+            snapshot.rainfall = parsed["rainfall"]
+            snapshot.update_time = parsed["update_time"]
+            weather_ok = True
         else:
             logger.error(f"❌ 获取实时天气失败 (HTTP {resp_weather.status_code})")
 
         # --- 2. 获取警告代码 ---
-        resp_warn = session.get(base_url, params={"dataType": "warnsum"}, timeout=5)
-        
+        resp_warn = session.get(BASE_URL, params={"dataType": "warnsum"}, timeout=5)
+
         if resp_warn.status_code == 200:
             warn_data = resp_warn.json()
             if warn_data:
                 for key, info in warn_data.items():
                     code = info.get('code')
                     if code:
-                        warning_codes.append(code)
-                if warning_codes:
-                    logger.info(f"⚠️ 检测到生效警告: {warning_codes}")
+                        snapshot.warnings.append(code)
+                if snapshot.warnings:
+                    logger.info(f"⚠️ 检测到生效警告: {snapshot.warnings}")
+            warn_ok = True
         else:
             logger.error(f"❌ 获取警告数据失败 (HTTP {resp_warn.status_code})")
 
@@ -125,7 +304,102 @@ def get_hko_weather() -> Tuple[Optional[float], Optional[int], List[str]]:
     except Exception as e:
         logger.error(f"❌ 未知程序错误: {e}")
 
-    return (temp_val, humidity_val, warning_codes)
+    snapshot.ok = weather_ok and warn_ok
+    return snapshot
+
+
+def location_from_fields(fields: Dict[str, str]) -> UserLocation:
+    lat = lon = None
+    raw = fields.get("坐标") or fields.get("location")
+    match = _COORDS_RE.search(raw) if raw else None
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+    return UserLocation(
+        lat=lat,
+        lon=lon,
+        station=fields.get("气象站") or fields.get("station"),
+        district=fields.get("地区") or fields.get("district"),
+    )
+
+
+def user_location(user_id: Optional[str]) -> UserLocation:
+    if not user_id:
+        return UserLocation()
+    profile = get_profile_store().get(user_id)
+    return location_from_fields(profile.fields) if profile else UserLocation()
+
+
+class HKOWeatherCache:
+    """
+    全港天气快照缓存：HKO_WEATHER_TTL 秒内所有用户共用同一份快照，过期后只有一个线程
+    重新请求（其它线程等待结果）；请求失败时继续使用上一份快照，_RETRY_AFTER_ERROR 秒后重试。
+    """
+
+    def __init__(self, ttl: float = HKO_WEATHER_TTL, fetcher: Callable[[], WeatherSnapshot] = fetch_snapshot):
+        self.ttl = ttl
+        self.fetcher = fetcher
+        self._snapshot: Optional[WeatherSnapshot] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "fetches": 0, "errors": 0}
+
+    def snapshot(self) -> WeatherSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._expires:
+            self.stats["hits"] += 1
+            inc("hko_weather_requests_total", result="hit")
+            return snapshot
+
+        with self._lock:
+            # 等锁期间其它线程可能已刷新
+            if self._snapshot is not None and time.monotonic() < self._expires:
+                self.stats["hits"] += 1
+                inc("hko_weather_requests_total", result="hit")
+                return self._snapshot
+            fresh = self.fetcher()
+            self.stats["fetches"] += 1
+            if fresh.ok or self._snapshot is None:
+                self._snapshot = fresh
+            if fresh.ok:
+                self._expires = time.monotonic() + self.ttl
+                inc("hko_weather_requests_total", result="fetch")
+            else:
+                self.stats["errors"] += 1
+                self._expires = time.monotonic() + min(self.ttl, _RETRY_AFTER_ERROR)
+                inc("hko_weather_requests_total", result="error")
+            return self._snapshot
+
+    def for_user(self, user_id: Optional[str] = None) -> UserWeather:
+        return self.snapshot().for_location(user_location(user_id))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires = 0.0
+
+
+_cache: Optional[HKOWeatherCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_weather_cache() -> HKOWeatherCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HKOWeatherCache()
+        return _cache
+
+
+def get_user_weather(user_id: Optional[str] = None) -> UserWeather:
+    """用户所在站点 / 地区的天气（来自共享快照）；无位置信息时取 HKO_DEFAULT_STATION。"""
+    return get_weather_cache().for_user(user_id)
+
+
+def get_hko_weather(user_id: Optional[str] = None) -> Tuple[Optional[float], Optional[int], List[str]]:
+    """
+    获取香港天气数据
+    :return: (温度, 湿度, 警告代码列表)
+    """
+    return get_user_weather(user_id).as_tuple()
 
 # ==========================================
 # 4. 使用示例
@@ -136,5 +410,7 @@ if __name__ == "__main__":
     
     if temp is not None:
         logger.info(f"当前天气: {temp}°C, 湿度 {hum}%")
+        snapshot = get_weather_cache().snapshot()
+        logger.info(f"本次快照: {len(snapshot.temperature)} 个温度站, {len(snapshot.rainfall)} 个雨量地区")
     else:
         logger.warning("未能获取天气数据")
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+知识库本地词法索引（BM25 + 中文字符 bigram）。
+
+与 person_basic_info_db 一同构建 (`lexical_index.pkl`)，检索时无需调用远端 embedding：
+- 英文/数字按词切分（"heart rate 115" -> heart / rate / 115）；
+- 中文连续片段切成字符 bigram（"高血压" -> 高血 / 血压），单字片段保留单字。
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+LEXICAL_INDEX_NAME = "lexical_index.pkl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        if not _CJK_RE.match(match):
+            tokens.append(match)
+        elif len(match) == 1:
+            tokens.append(match)
+        else:
+            tokens.extend(match[i : i + 2] for i in range(len(match) - 1))
+    return tokens
+
+
+class BM25Index:
+    """倒排索引 + Okapi BM25 打分，文档正文随索引一起保存，可独立于 FAISS 使用。"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.documents: List[Document] = []
+        self.doc_lens: List[int] = []
+        self.avgdl = 0.0
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.idf: Dict[str, float] = {}
+
+    @classmethod
+    def from_documents(
+        cls, ids: Sequence[str], documents: Sequence[Document], **kwargs
+    ) -> "BM25Index":
+        index = cls(**kwargs)
+        for doc_id, doc in zip(ids, documents):
+            index._add(doc_id, doc)
+        index._finalize()
+        return index
+
+    def _add(self, doc_id: str, doc: Document) -> None:
+        idx = len(self.doc_ids)
+        counts = Counter(tokenize(doc.page_content))
+        self.doc_ids.append(doc_id)
+        self.documents.append(Document(page_content=doc.page_content, metadata=dict(doc.metadata)))
+        self.doc_lens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, []).append((idx, tf))
+
+    def _finalize(self) -> None:
+        n = len(self.doc_ids)
+        self.avgdl = (sum(self.doc_lens) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        scores: Dict[int, float] = {}
+        avgdl = self.avgdl or 1.0
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for idx, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[idx] / avgdl)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[idx], score) for idx, score in ranked]
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def save(self, folder_path: str) -> None:
+        os.makedirs(folder_path, exist_ok=True)
+        path = os.path.join(folder_path, LEXICAL_INDEX_NAME)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, folder_path: str) -> Optional["BM25Index"]:
+        path = os.path.join(folder_path, LEXICAL_INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+
+def build_from_vectorstore(store) -> BM25Index:
+    """从 FAISS docstore 重建词法索引（不涉及 embedding，仅本地分词）。"""
+    ids = [store.index_to_docstore_id[i] for i in sorted(store.index_to_docstore_id)]
+    docs = [store.docstore.search(doc_id) for doc_id in ids]
+    return BM25Index.from_documents(ids, docs)
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[Sequence[Document]], k: int = 3, c: int = 60
+) -> List[Document]:
+    """按 RRF 融合多路排序结果，以正文去重。"""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (c + rank + 1)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in ordered]
@@ -12,9 +12,10 @@ import random
 import sys
 from typing import Any, Dict
 
-import paho.mqtt.client as mqtt
-
 from config import LLM_OUTPUT_TOPIC, MQTT_BROKER, MQTT_PORT
+from metrics import traced
+from mqtt_transport import create_client
+from serialization import dumps_bytes
 
 
 def _load_payload(arg: str) -> Dict[str, Any]:
@@ -25,14 +26,12 @@ def _load_payload(arg: str) -> Dict[str, Any]:
     return json.loads(arg)
 
 
+@traced("mqtt_publish_llm_output")
 def send_llm_output(payload: Dict[str, Any], *, client_id: str | None = None) -> None:
-    client = mqtt.Client(
-        mqtt.CallbackAPIVersion.VERSION2,
-        client_id or f"llm-output-{random.randint(0, 9999)}",
-    )
+    client = create_client(client_id or f"llm-output-{random.randint(0, 9999)}")
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
     client.loop_start()
-    client.publish(LLM_OUTPUT_TOPIC, json.dumps(payload, ensure_ascii=False), retain=False)
+    client.publish(LLM_OUTPUT_TOPIC, dumps_bytes(payload), retain=False)
     client.loop_stop()
     client.disconnect()
 
@@ -0,0 +1,497 @@
+"""
+传感器流录制 / 合成 / 回放 压测工具（完全离线）。
+
+- synth: 为 N 台模拟设备合成 `ierg6200/health/monitor1` 传感器消息（格式见 docs/system_overview.md）
+         以及提醒状态回执（completed / ignored），保存为 JSONL；
+- record: 从真实 Broker 录制传感器与提醒消息到 JSONL（需要网络，仅录制时使用）；
+- replay: 以 N 倍速把 JSONL 回放进进程内 LocalBroker，驱动完整链路
+          (HealthMonitor 订阅 / RiskRouter.route / build_mqtt_payload / send_llm_output / ReminderSync)，
+          统计摄入速率、丢弃消息数、到 `llmoutput` 的端到端延迟。
+
+用法:
+    python load_generator.py synth --devices 50 --duration 600 --interval 5 --out load.jsonl
+    python load_generator.py replay load.jsonl --speed 20 --workers 4
+    python load_generator.py replay --devices 20 --duration 120 --speed 10   # 现场合成并回放
+    python load_generator.py record --duration 300 --out live.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from routing_benchmark import REPO_DIR, _build_kb, summarize
+
+LOADGEN_SOURCE = "loadgen"
+
+
+# ------------------------------------------------------------------
+# 合成 / 录制
+# ------------------------------------------------------------------
+def synthesize(
+    devices: int,
+    duration_s: float,
+    interval_s: float,
+    *,
+    reminder_rate: float = 0.05,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    返回按时间排序的事件列表，每条为 {"t": 相对秒, "topic": ..., "payload": {...}}。
+    生命体征做随机游走，部分设备会进入心率偏高 / 睡眠不足状态以覆盖不同风险路由。
+    """
+    from config import REMINDER_TOPIC, SENSOR_TOPIC
+
+    rng = random.Random(seed)
+    events: List[Dict[str, Any]] = []
+    start_ts = int(time.time())
+    for d in range(devices):
+        device_id = f"watch_{d:04d}"
+        hr = rng.uniform(65, 100)
+        steps = rng.randint(0, 2000)
+        sleep = round(rng.uniform(4.5, 8.0), 1)
+        t = rng.uniform(0, interval_s)
+        seq = 0
+        while t < duration_s:
+            hr = min(140.0, max(45.0, hr + rng.gauss(0, 4)))
+            steps += rng.randint(0, 120)
+            events.append(
+                {
+                    "t": round(t, 4),
+                    "topic": SENSOR_TOPIC,
+                    "payload": {
+                        "device_id": device_id,
+                        "timestamp": start_ts + int(t),
+                        "seq": seq,
+                        "metrics": {"heart_rate": round(hr), "steps": steps, "sleep": sleep},
+                    },
+                }
+            )
+            if rng.random() < reminder_rate:
+                events.append(
+                    {
+                        "t": round(t + 0.001, 4),
+                        "topic": REMINDER_TOPIC,
+                        "payload": {
+                            "event": rng.choice(["completed", "ignored"]),
+                            "reminder": {"user_id": device_id},
+                            "source": LOADGEN_SOURCE,
+                            "published_at": start_ts + t,
+                        },
+                    }
+                )
+            seq += 1
+            t += interval_s
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def save_events(events: List[Dict[str, Any]], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def load_events(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def record(path: str, duration_s: float) -> int:
+    """从真实 Broker 录制传感器与提醒消息。"""
+    from config import MQTT_BROKER, MQTT_PORT, REMINDER_TOPIC, SENSOR_TOPIC
+    from mqtt_transport import create_client
+
+    events: List[Dict[str, Any]] = []
+    start = time.time()
+    client = create_client(f"loadgen-recorder-{random.randint(0, 9999)}", transport="paho")
+
+    def on_connect(c, userdata, flags, rc, properties=None):
+        c.subscribe(SENSOR_TOPIC)
+        c.subscribe(REMINDER_TOPIC)
+
+    def on_message(c, userdata, msg):
+        try:
+            payload = json.loads(msg.payload.decode("utf-8"))
+        except Exception:
+            return
+        events.append({"t": round(time.time() - start, 4), "topic": msg.topic, "payload": payload})
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    time.sleep(duration_s)
+    client.loop_stop()
+    client.disconnect()
+    save_events(events, path)
+    return len(events)
+
+
+# ------------------------------------------------------------------
+# 被测链路
+# ------------------------------------------------------------------
+def _prepare_env(workdir: Optional[str], embedding: str, kb_path: Optional[str]) -> str:
+    workdir = workdir or tempfile.mkdtemp(prefix="loadgen_")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["EMBEDDING_BACKEND"] = embedding
+    os.environ["MQTT_TRANSPORT"] = "local"
+    os.environ["SYSTEM_MEMORY_PATH"] = os.path.join(workdir, "system_memory_db")
+    os.environ["REMINDER_DB_PATH"] = os.path.join(workdir, "reminders.db")
+    os.environ["VITALS_DB_PATH"] = os.path.join(workdir, "vitals.db")
+    os.environ["PERSON_KB_PATH"] = kb_path or os.path.join(workdir, "person_basic_info_db")
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return workdir
+
+
+def _fake_llm(latency_ms: float):
+    from langchain_community.chat_models.fake import FakeListChatModel
+
+    return FakeListChatModel(
+        responses=['{"message": "保持补水与休息，关注近期睡眠", "evidence": {"note": "loadgen"}}'],
+        sleep=latency_ms / 1000 if latency_ms else None,
+    )
+
+
+class PipelineDriver:
+    """
+    订阅传感器 Topic，把每条（或每第 K 条）设备消息送入有界队列，由工作线程执行
+    route -> build_mqtt_payload -> send_llm_output；队列满即丢弃并计数。
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        queue_size: int,
+        route_every: int,
+        weather: Dict[str, Any],
+        llm_latency_ms: float = 0.0,
+    ):
+        from config import SENSOR_TOPIC
+        from mqtt_transport import create_client
+        from routing_engine import RiskRouter
+
+        self.router = RiskRouter(llm=_fake_llm(llm_latency_ms))
+        self.route_every = max(1, route_every)
+        self.weather = weather
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(queue_size)
+        self.counters: Counter = Counter()
+        self.routes: Counter = Counter()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"loadgen-worker-{i}")
+            for i in range(workers)
+        ]
+        self.client = create_client("loadgen-driver")
+        self.client.on_connect = lambda c, u, f, rc, p=None: c.subscribe(SENSOR_TOPIC)
+        self.client.on_message = self._on_message
+
+    def start(self) -> None:
+        from config import MQTT_BROKER, MQTT_PORT
+
+        for worker in self._workers:
+            worker.start()
+        self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+
+    def stop(self) -> None:
+        self.client.loop_stop()
+        for _ in self._workers:
+            self.queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def _on_message(self, client, userdata, msg) -> None:
+        self._count("received")
+        try:
+            data = json.loads(msg.payload.decode("utf-8"))
+        except Exception:
+            self._count("parse_errors")
+            return
+        if data.get("seq", 0) % self.route_every:
+            return
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self._count("dropped")
+
+    def _work(self) -> None:
+        from llm_output_sender import send_llm_output
+        from mqtt_payload import build_mqtt_payload
+
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            metrics = data.get("metrics", {})
+            device_id = data.get("device_id", "unknown")
+            state = {
+                "user_id": device_id,
+                "timestamp": data.get("timestamp"),
+                "weather": dict(self.weather),
+                "vitals": {
+                    "heart_rate": metrics.get("heart_rate"),
+                    "steps": metrics.get("steps"),
+                    "sleep": metrics.get("sleep"),
+                },
+                "notes": "loadgen",
+            }
+            try:
+                result = self.router.route(state)
+                payload = build_mqtt_payload(result, state, self.router.reminder_manager)
+                payload["trace_id"] = f"{device_id}:{data.get('seq')}"
+                send_llm_output(payload)
+                with self._lock:
+                    self.counters["routed"] += 1
+                    self.routes[result["route"]] += 1
+            except Exception:
+                self._count("pipeline_errors")
+
+
+class OutputCollector:
+    """订阅 llmoutput，按 trace_id 计算端到端延迟。"""
+
+    def __init__(self, sent_at: Dict[str, float]):
+        from config import LLM_OUTPUT_TOPIC
+        from mqtt_transport import create_client
+
+        self.sent_at = sent_at
+        self.latencies_ms: List[float] = []
+        self.received = 0
+        self._lock = threading.Lock()
+        self.client = create_client("loadgen-collector")
+        self.client.on_connect = lambda c, u, f, rc, p=None: c.subscribe(LLM_OUTPUT_TOPIC)
+        self.client.on_message = self._on_message
+
+    def start(self) -> None:
+        from config import MQTT_BROKER, MQTT_PORT
+
+        self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+
+    def stop(self) -> None:
+        self.client.loop_stop()
+
+    def _on_message(self, client, userdata, msg) -> None:
+        now = time.perf_counter()
+        try:
+            trace_id = json.loads(msg.payload.decode("utf-8")).get("trace_id")
+        except Exception:
+            return
+        with self._lock:
+            self.received += 1
+            sent = self.sent_at.get(trace_id)
+            if sent is not None:
+                self.latencies_ms.append((now - sent) * 1000)
+
+
+# ------------------------------------------------------------------
+# 回放
+# ------------------------------------------------------------------
+def replay(
+    events: List[Dict[str, Any]],
+    *,
+    speed: float,
+    workers: int,
+    queue_size: int,
+    route_every: int,
+    drain_timeout: float,
+    weather: Dict[str, Any],
+    llm_latency_ms: float = 0.0,
+) -> Dict[str, Any]:
+    from config import MQTT_BROKER, MQTT_PORT, SENSOR_TOPIC
+    from mqtt_transport import create_client, local_broker
+    from reminder_sync import start_reminder_sync
+    from user_sensors import get_sensor_stats  # 导入即启动 HealthMonitor（同样订阅传感器 Topic）
+
+    driver = PipelineDriver(
+        workers=workers,
+        queue_size=queue_size,
+        route_every=route_every,
+        weather=weather,
+        llm_latency_ms=llm_latency_ms,
+    )
+    # 回执需要引用真实存在的提醒，预先为每个用户准备一条
+    reminder_ids: Dict[str, int] = {}
+    manager = driver.router.reminder_manager
+    sync = start_reminder_sync(manager)
+
+    sent_at: Dict[str, float] = {}
+    collector = OutputCollector(sent_at)
+    collector.start()
+    driver.start()
+
+    publisher = create_client("loadgen-publisher")
+    publisher.connect(MQTT_BROKER, MQTT_PORT, 60)
+    local_broker().reset_stats()
+
+    published: Counter = Counter()
+    start = time.perf_counter()
+    for event in events:
+        target = start + event["t"] / speed
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        payload = event["payload"]
+        if event["topic"] == SENSOR_TOPIC:
+            sent_at[f"{payload.get('device_id')}:{payload.get('seq')}"] = time.perf_counter()
+            published["sensor"] += 1
+        else:
+            reminder = payload.setdefault("reminder", {})
+            user_id = reminder.get("user_id", "loadgen")
+            if user_id not in reminder_ids:
+                reminder_ids[user_id] = manager.create_reminder("loadgen 回执测试", user_id=user_id).id
+            reminder["id"] = reminder_ids[user_id]
+            reminder["status"] = payload.get("event")
+            published["reminder"] += 1
+        publisher.publish(event["topic"], json.dumps(payload, ensure_ascii=False))
+    send_elapsed = time.perf_counter() - start
+
+    # 等待每条应路由的消息都有结果（送达 llmoutput / 被丢弃 / 出错）
+    expected = sum(
+        1
+        for e in events
+        if e["topic"] == SENSOR_TOPIC and e["payload"].get("seq", 0) % max(1, route_every) == 0
+    )
+    deadline = time.perf_counter() + drain_timeout
+    while time.perf_counter() < deadline:
+        settled = collector.received + driver.counters["dropped"] + driver.counters["pipeline_errors"]
+        if settled >= expected - local_broker().stats["dropped"]:
+            break
+        time.sleep(0.05)
+    total_elapsed = time.perf_counter() - start
+
+    driver.stop()
+    collector.stop()
+    sync.client.loop_stop()
+
+    broker_stats = dict(local_broker().stats)
+    return {
+        "events": len(events),
+        "published": dict(published),
+        "speed": speed,
+        "send_elapsed_s": round(send_elapsed, 3),
+        "total_elapsed_s": round(total_elapsed, 3),
+        "offered_rate_msg_s": round(len(events) / send_elapsed, 1) if send_elapsed else 0.0,
+        "ingestion_rate_msg_s": round(driver.counters["received"] / total_elapsed, 1) if total_elapsed else 0.0,
+        "routed": driver.counters["routed"],
+        "routed_rate_s": round(driver.counters["routed"] / total_elapsed, 2) if total_elapsed else 0.0,
+        "routes": dict(driver.routes),
+        "driver": dict(driver.counters),
+        "broker": broker_stats,
+        "ingest": get_sensor_stats(),
+        "dropped_total": driver.counters["dropped"] + broker_stats.get("dropped", 0),
+        "llmoutput_received": collector.received,
+        "e2e_latency": summarize(collector.latencies_ms),
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"事件 {report['events']} 条 ({report['published']}), 回放倍速 {report['speed']}x")
+    print(f"发送耗时 {report['send_elapsed_s']}s, 总耗时 {report['total_elapsed_s']}s")
+    print(f"发送速率 {report['offered_rate_msg_s']} msg/s, 摄入速率 {report['ingestion_rate_msg_s']} msg/s")
+    print(f"完成路由 {report['routed']} 次 ({report['routed_rate_s']}/s), 路由分布 {report['routes']}")
+    print(f"丢弃 {report['dropped_total']} 条 (driver={report['driver'].get('dropped', 0)}, broker={report['broker'].get('dropped', 0)})")
+    ingest = report["ingest"]
+    print(
+        f"HealthMonitor 摄入: 收到 {ingest['received']} 解析 {ingest['parsed']} 失败 {ingest['parse_errors']} "
+        f"溢出丢弃 {ingest['dropped']}, 排队延迟 avg={ingest['lag_avg_ms']}ms max={ingest['lag_max_ms']}ms"
+    )
+    latency = report["e2e_latency"]
+    print(
+        f"llmoutput 收到 {report['llmoutput_received']} 条, 端到端延迟 "
+        f"p50={latency.get('p50_ms')}ms p95={latency.get('p95_ms')}ms max={latency.get('max_ms')}ms"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="传感器流合成 / 录制 / 回放压测")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_synth_args(p):
+        p.add_argument("--devices", type=int, default=20)
+        p.add_argument("--duration", type=float, default=120, help="模拟时长 (秒)")
+        p.add_argument("--interval", type=float, default=5, help="每台设备上报间隔 (秒)")
+        p.add_argument("--reminder-rate", type=float, default=0.05, help="每条传感器消息附带回执的概率")
+        p.add_argument("--seed", type=int, default=0)
+
+    synth = sub.add_parser("synth", help="合成事件并保存为 JSONL")
+    add_synth_args(synth)
+    synth.add_argument("--out", required=True)
+
+    rec = sub.add_parser("record", help="从真实 Broker 录制")
+    rec.add_argument("--duration", type=float, default=300)
+    rec.add_argument("--out", required=True)
+
+    rep = sub.add_parser("replay", help="回放到进程内 Broker 并统计")
+    rep.add_argument("events", nargs="?", help="JSONL 文件；省略时按合成参数现场生成")
+    add_synth_args(rep)
+    rep.add_argument("--speed", type=float, default=10.0, help="回放倍速")
+    rep.add_argument("--workers", type=int, default=4, help="路由工作线程数")
+    rep.add_argument("--queue-size", type=int, default=1000)
+    rep.add_argument("--route-every", type=int, default=1, help="每台设备每 K 条消息路由一次")
+    rep.add_argument("--drain-timeout", type=float, default=60)
+    rep.add_argument("--temperature", type=float, default=31)
+    rep.add_argument("--warnings", nargs="*", default=[])
+    rep.add_argument("--llm-latency-ms", type=float, default=0.0, help="模拟 LLM 调用耗时")
+    rep.add_argument("--embedding", default="hashing", choices=["hashing", "fake"])
+    rep.add_argument("--workdir")
+    rep.add_argument("--kb-path", help="使用已有知识库（默认在临时目录用 person_basic_info 构建）")
+    rep.add_argument("--report", help="统计结果 JSON 保存路径")
+
+    args = parser.parse_args(argv)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    if args.command == "synth":
+        events = synthesize(args.devices, args.duration, args.interval, reminder_rate=args.reminder_rate, seed=args.seed)
+        save_events(events, args.out)
+        print(f"已生成 {len(events)} 条事件 -> {args.out}")
+        return
+
+    if args.command == "record":
+        count = record(args.out, args.duration)
+        print(f"已录制 {count} 条事件 -> {args.out}")
+        return
+
+    _prepare_env(args.workdir, args.embedding, args.kb_path)
+    if not args.kb_path:
+        _build_kb()
+    events = (
+        load_events(args.events)
+        if args.events
+        else synthesize(args.devices, args.duration, args.interval, reminder_rate=args.reminder_rate, seed=args.seed)
+    )
+    report = replay(
+        events,
+        speed=args.speed,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        route_every=args.route_every,
+        drain_timeout=args.drain_timeout,
+        weather={"temperature": args.temperature, "humidity": 80, "warnings": args.warnings},
+        llm_latency_ms=args.llm_latency_ms,
+    )
+    _print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,23 @@ from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 
 from config import (
     DEFAULT_USER_ID,
-    EMBEDDING_MODEL,
-    OPENAI_API_KEY,
-    OPENAI_BASE_URL,
+    KB_INDEX_TYPE,
+    KB_LEXICAL_CANDIDATES,
+    KB_RETRIEVAL_MODE,
+    MEMORY_RETRIEVAL_MODE,
     PERSON_KB_PATH,
-    USER_PROFILE_PATH,
 )
-from system_memory import SystemMemoryManager
+from embedding_backends import EmbeddingMismatchError, get_embeddings, index_mismatch
+from metrics import traced
+from lexical_index import BM25Index, build_from_vectorstore, reciprocal_rank_fusion
+from system_memory import SystemMemoryManager, get_system_memory
+from user_profiles import ProfileStore, get_profile_store
+from vector_index import derived_index_name, ensure_index_type, has_derived_index
 
 
 @dataclass
@@ -37,44 +42,63 @@ class RetrievedContext:
 class MultiLayerMemory:
     """
     负责统一管理“外部健康知识 + 用户档案 + 短期记忆”。
+    用户档案按 user_id 从 ProfileStore 取（LRU 缓存），不再所有用户共用同一份。
     """
 
     def __init__(
         self,
         faiss_path: str = PERSON_KB_PATH,
-        user_profile_path: str = USER_PROFILE_PATH,
+        profile_store: Optional[ProfileStore] = None,
         system_memory: Optional[SystemMemoryManager] = None,
+        index_type: str = KB_INDEX_TYPE,
+        retrieval_mode: str = KB_RETRIEVAL_MODE,
+        embeddings: Optional[Embeddings] = None,
+        memory_mode: str = MEMORY_RETRIEVAL_MODE,
     ):
         self.faiss_path = faiss_path
-        if os.getenv("USE_FAKE_EMBEDDINGS") == "1":
-            from langchain_community.embeddings import FakeEmbeddings
-
-            self.embeddings = FakeEmbeddings(size=1536)
-        else:
-            self.embeddings = OpenAIEmbeddings(
-                base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL
-            )
+        self.index_type = index_type
+        self.retrieval_mode = retrieval_mode
+        self.memory_mode = memory_mode
+        self.embeddings = embeddings or get_embeddings()
         self.health_kb: Optional[FAISS] = None
-        self.system_memory = system_memory or SystemMemoryManager()
-        self.user_profile_text = self._load_user_profile(user_profile_path)
+        self.lexical_kb: Optional[BM25Index] = None
+        self.system_memory = system_memory or get_system_memory()
+        self.profiles = profile_store or get_profile_store()
         self._load_health_kb()
+        if self.retrieval_mode in {"lexical", "hybrid"}:
+            self._load_lexical_kb()
 
     def _load_health_kb(self) -> None:
-        if os.path.isdir(self.faiss_path):
-            try:
-                self.health_kb = FAISS.load_local(
-                    self.faiss_path,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True,
-                )
-            except Exception:
-                self.health_kb = None
-
-    def _load_user_profile(self, path: str) -> Optional[str]:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read()
-        return None
+        if not os.path.isdir(self.faiss_path):
+            return
+        # 优先加载 vector_index.py 预先训练好的派生索引，避免每个 worker 常驻 flat 向量
+        derived = has_derived_index(self.faiss_path, self.index_type)
+        try:
+            self.health_kb = FAISS.load_local(
+                self.faiss_path,
+                self.embeddings,
+                index_name=derived_index_name(self.index_type) if derived else "index",
+                allow_dangerous_deserialization=True,
+            )
+        except Exception:
+            self.health_kb = None
+            return
+        # 向量空间不一致时检索结果无意义（维度不同还会在 faiss 内部报错），拒绝加载
+        reason = index_mismatch(self.faiss_path, self.health_kb.index.d, self.embeddings)
+        if reason:
+            self.health_kb = None
+            raise EmbeddingMismatchError(
+                f"知识库索引 {self.faiss_path} 与当前 embedding 不一致：{reason}。"
+                "请运行 python long_memory_storage.py --full 重建，或切回原 EMBEDDING_BACKEND。"
+            )
+        # 未预先生成派生索引时在内存中转换（样本不足以训练时保持 flat）
+        ensure_index_type(self.health_kb, self.index_type)
+
+    def _load_lexical_kb(self) -> None:
+        self.lexical_kb = BM25Index.load(self.faiss_path)
+        if self.lexical_kb is None and self.health_kb is not None:
+            # 旧版知识库没有词法索引文件时，从 docstore 现场构建
+            self.lexical_kb = build_from_vectorstore(self.health_kb)
 
     # ------------------------------------------------------------------
     # 检索
@@ -103,6 +127,7 @@ class MultiLayerMemory:
 
         return " | ".join(filter(None, parts)) or "health advice"
 
+    @traced("retrieve")
     def retrieve(
         self,
         state: Dict[str, Any],
@@ -110,20 +135,46 @@ class MultiLayerMemory:
         query: Optional[str] = None,
         user_id: str = DEFAULT_USER_ID,
         k: int = 3,
+        memory_k: Optional[int] = None,
     ) -> RetrievedContext:
         query = query or self._state_to_query(state)
 
-        knowledge_docs: List[Document] = []
-        if self.health_kb:
-            knowledge_docs = self.health_kb.similarity_search(query, k=k)
+        knowledge_docs = self._search_knowledge(query, k)
 
-        short_term = self.system_memory.search_recent(query=query, user_id=user_id)
+        if self.memory_mode == "recent":
+            short_term = self.system_memory.recent_events(user_id=user_id, top_k=memory_k)
+        else:
+            short_term = self.system_memory.search_recent(query=query, user_id=user_id, top_k=memory_k)
 
         return RetrievedContext(
             knowledge_snippets=knowledge_docs,
             short_term_memory=short_term,
-            user_profile=self.user_profile_text,
+            user_profile=self.profiles.get_text(user_id),
+        )
+
+    def _search_knowledge(self, query: str, k: int) -> List[Document]:
+        if self.retrieval_mode == "lexical":
+            # lexical 模式完全不调用 embedding：未命中时返回空，不回退向量检索
+            if self.lexical_kb is None:
+                return []
+            return [doc for doc, _ in self.lexical_kb.search(query, k=k)]
+
+        lexical_docs: List[Document] = []
+        if self.lexical_kb is not None and self.retrieval_mode == "hybrid":
+            lexical_docs = [
+                doc for doc, _ in self.lexical_kb.search(query, k=max(k, KB_LEXICAL_CANDIDATES))
+            ]
+
+        if not self.health_kb:
+            return lexical_docs[:k]
+
+        if self.retrieval_mode != "hybrid" or not lexical_docs:
+            return self.health_kb.similarity_search(query, k=k)
+
+        vector_docs = self.health_kb.similarity_search(
+            query, k=max(k, KB_LEXICAL_CANDIDATES)
         )
+        return reciprocal_rank_fusion([lexical_docs, vector_docs], k=k)
 
     # ------------------------------------------------------------------
     # 便捷写入
@@ -1,95 +1,325 @@
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
+import sys
+from typing import Dict, List, Optional
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from config import (
-    OPENAI_API_KEY,
-    OPENAI_BASE_URL,
-    EMBEDDING_MODEL,
+    KB_INDEX_TYPE,
     PERSON_KB_PATH,
 )
+from embedding_backends import (
+    INDEX_META_FILE,
+    embedding_signature,
+    get_embeddings,
+    write_index_meta,
+)
+from lexical_index import LEXICAL_INDEX_NAME, BM25Index, build_from_vectorstore
+from token_counter import annotate
+from vector_index import (
+    delete_documents,
+    has_derived_index,
+    remove_derived_indexes,
+    write_derived_index,
+)
 
 # 定义文件夹路径
 DATA_PATH    = "person_basic_info"  # 你的文档所在文件夹
 DB_SAVE_PATH = PERSON_KB_PATH     # 向量数据库保存路径
 
-def create_vector_db():
+# 切分参数：与 manifest 一起记录，参数变化时自动全量重建
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# 文件/片段哈希清单，与 FAISS 索引放在同一目录
+MANIFEST_NAME = "kb_manifest.json"
+MANIFEST_VERSION = 1
+
+
+# ------------------------------------------------------------------
+# 索引文件
+# ------------------------------------------------------------------
+def _clear_store(db_path: str = DB_SAVE_PATH) -> None:
+    """删除向量索引、派生索引、词法索引与 embedding 元数据，保留 manifest。"""
+    for name in ("index.faiss", "index.pkl", INDEX_META_FILE, LEXICAL_INDEX_NAME):
+        path = os.path.join(db_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+    remove_derived_indexes(db_path)
+
+
+# ------------------------------------------------------------------
+# 哈希清单 (manifest)
+# ------------------------------------------------------------------
+def _manifest_path(db_path: str = DB_SAVE_PATH) -> str:
+    return os.path.join(db_path, MANIFEST_NAME)
+
+
+def _load_manifest(db_path: str = DB_SAVE_PATH) -> Optional[Dict]:
+    path = _manifest_path(db_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # 切分参数或 embedding 后端/模型变化后，旧片段/向量不可复用
+    expected = {
+        "version": MANIFEST_VERSION,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": embedding_signature(),
+    }
+    if any(manifest.get(key) != value for key, value in expected.items()):
+        return None
+    return manifest
+
+
+def _save_manifest(files: Dict[str, Dict], db_path: str = DB_SAVE_PATH) -> None:
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": embedding_signature(),
+        "files": files,
+    }
+    tmp_path = _manifest_path(db_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, _manifest_path(db_path))
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_ids(chunks: List[Document]) -> List[str]:
+    """片段 ID = 来源文件 + 片段内容的哈希；同一文件内重复片段追加序号保证唯一。"""
+    ids = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        base = hashlib.sha256(
+            f"{source}\x00{chunk.page_content}".encode("utf-8")
+        ).hexdigest()
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        ids.append(base if count == 0 else f"{base}-{count}")
+    return ids
+
+
+def _scan_files(data_path: str = DATA_PATH) -> List[str]:
+    paths = []
+    for root, _, names in os.walk(data_path):
+        for name in names:
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def _split_file(path: str, splitter: RecursiveCharacterTextSplitter) -> List[Document]:
+    docs = PyPDFLoader(path).load()
+    for doc in docs:
+        doc.metadata["source"] = path
+    chunks = splitter.split_documents(docs)
+    # 预先计算 token 数，组装 RAG prompt 时按预算挑选无需重新计数
+    for chunk in chunks:
+        annotate(chunk.metadata, chunk.page_content)
+    return chunks
+
+
+def _load_store(embeddings, db_path: str = DB_SAVE_PATH) -> Optional[FAISS]:
+    if not os.path.isdir(db_path):
+        return None
+    try:
+        return FAISS.load_local(
+            db_path, embeddings, allow_dangerous_deserialization=True
+        )
+    except Exception:
+        return None
+
+
+# ------------------------------------------------------------------
+# 构建 / 增量更新
+# ------------------------------------------------------------------
+def create_vector_db(full_rebuild: bool = False) -> Optional[Dict[str, int]]:
+    """
+    构建或增量更新知识库向量索引。
+
+    - 未变化的文件 (size/mtime 或 sha256 一致) 不再解析；
+    - 变化的文件重新切分，仅为新出现的片段调用 embedding；
+    - 已删除的文件 / 消失的片段会从索引中移除对应向量。
+
+    full_rebuild=True 或 manifest 缺失/参数不一致时退化为全量构建。
+    返回本次更新的统计信息。
+    """
     print("🔄 开始加载文档...")
-    
-    docs = []
-    
-    # 1. 加载 PDF 文件
-    if os.path.exists(DATA_PATH):
-        # 加载 PDF
-        pdf_loader = DirectoryLoader(DATA_PATH, glob="**/*.pdf", loader_cls=PyPDFLoader)
-        pdf_docs = pdf_loader.load()
-        docs.extend(pdf_docs)
-        print("已加载的 PDF 文件:", list(set(doc.metadata["source"] for doc in pdf_docs)))
-        # print(f"   - 加载了 {len(pdf_docs)} 个 PDF 文档")
-
-    else:
+
+    if not os.path.exists(DATA_PATH):
         print(f"❌ 错误：找不到文件夹 '{DATA_PATH}'，请先创建并放入文件。")
-        return
+        return None
 
-    if not docs:
-        print("❌ 未找到任何文件，请检查文件夹内容。")
-        return
+    paths = _scan_files(DATA_PATH)
+    if not paths:
+        # 仍需走增量流程：旧 manifest 中的文件全部视为已删除
+        print("⚠️ 未找到任何文件，将移除知识库中已删除文件的片段。")
+
+    # 由 config.EMBEDDING_BACKEND 决定远端接口或本地 CPU 后端
+    embeddings = get_embeddings()
+
+    manifest = None if full_rebuild else _load_manifest(DB_SAVE_PATH)
+    vector_store = _load_store(embeddings, DB_SAVE_PATH) if manifest else None
+    if vector_store is None:
+        # 没有可复用的索引，按全量构建处理
+        manifest = None
+    old_files: Dict[str, Dict] = manifest["files"] if manifest else {}
 
-    # 2. 文本切分 (Text Splitter)
     # 使用与你 Notebook 中类似的切分参数
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,  # 每个块的大小
-        chunk_overlap=200 # 上下文重叠部分
-    )
-    splits = text_splitter.split_documents(docs)
-    print(f"✂️  文档已切分为 {len(splits)} 个片段")
-
-    # 3. 初始化 Embedding 模型
-    embeddings = OpenAIEmbeddings(
-        base_url=OPENAI_BASE_URL,
-        api_key=OPENAI_API_KEY,
-        model=EMBEDDING_MODEL # 推荐使用此模型，性价比高
+        chunk_size=CHUNK_SIZE,  # 每个块的大小
+        chunk_overlap=CHUNK_OVERLAP # 上下文重叠部分
     )
 
-    # 4. 向量化并存入 FAISS
-    print("zzZ  正在生成向量并存入 FAISS (这可能需要一点时间)...")
-    vector_store = FAISS.from_documents(splits, embeddings)
+    stats = {"parsed_files": 0, "added_chunks": 0, "removed_chunks": 0}
+    new_files: Dict[str, Dict] = {}
+    new_chunks: List[Document] = []
+    new_ids: List[str] = []
+    stale_ids: List[str] = []
+
+    # 1. 对比文件哈希，只解析变化的文件
+    for path in paths:
+        stat = os.stat(path)
+        old_entry = old_files.get(path)
+        if (
+            old_entry
+            and old_entry.get("size") == stat.st_size
+            and old_entry.get("mtime") == stat.st_mtime
+        ):
+            new_files[path] = old_entry
+            continue
+
+        sha = _file_sha256(path)
+        if old_entry and old_entry.get("sha256") == sha:
+            new_files[path] = dict(old_entry, size=stat.st_size, mtime=stat.st_mtime)
+            continue
+
+        splits = _split_file(path, text_splitter)
+        ids = _chunk_ids(splits)
+        stats["parsed_files"] += 1
+        print(f"📄 解析变化文件: {path} -> {len(splits)} 个片段")
+
+        # 2. 片段级对比：只 embedding 新片段，删除不再存在的片段
+        old_ids = set(old_entry["chunks"]) if old_entry else set()
+        for chunk, chunk_id in zip(splits, ids):
+            if chunk_id not in old_ids:
+                new_chunks.append(chunk)
+                new_ids.append(chunk_id)
+        stale_ids.extend(old_ids - set(ids))
+
+        new_files[path] = {
+            "sha256": sha,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunks": ids,
+        }
+
+    # 3. 已删除的文件：移除其全部片段
+    for path, entry in old_files.items():
+        if path not in new_files:
+            print(f"🗑️  文件已移除: {path}")
+            stale_ids.extend(entry["chunks"])
 
-    # 5. 保存到本地磁盘
+    if vector_store is not None and stale_ids:
+        known_ids = set(vector_store.index_to_docstore_id.values())
+        stale_ids = [chunk_id for chunk_id in stale_ids if chunk_id in known_ids]
+        if stale_ids:
+            delete_documents(vector_store, stale_ids)
+        stats["removed_chunks"] = len(stale_ids)
+
+    if new_chunks:
+        # 4. 向量化并存入 FAISS
+        print(f"zzZ  正在为 {len(new_chunks)} 个新片段生成向量并存入 FAISS...")
+        if vector_store is None:
+            vector_store = FAISS.from_documents(new_chunks, embeddings, ids=new_ids)
+        else:
+            vector_store.add_documents(new_chunks, ids=new_ids)
+        stats["added_chunks"] = len(new_chunks)
+
+    if vector_store is None and paths:
+        print("❌ 文档中没有可用的文本片段。")
+        return stats
+
+    if vector_store is None or not vector_store.index.ntotal:
+        # 所有片段都已移除：删除旧索引文件，避免检索到已删除文件的内容
+        os.makedirs(DB_SAVE_PATH, exist_ok=True)
+        _clear_store(DB_SAVE_PATH)
+        _save_manifest(new_files, DB_SAVE_PATH)
+        print(f"✅ 知识库已清空，移除 {stats['removed_chunks']} 个片段。")
+        return stats
+
+    if not stats["added_chunks"] and not stats["removed_chunks"] and manifest:
+        _save_manifest(new_files, DB_SAVE_PATH)
+        # manifest 已确认 embedding 签名一致，旧版知识库在此补写索引元数据
+        write_index_meta(DB_SAVE_PATH, embedding_signature(), vector_store.index.d)
+        if not has_derived_index(DB_SAVE_PATH, KB_INDEX_TYPE):
+            write_derived_index(vector_store, DB_SAVE_PATH, KB_INDEX_TYPE)
+        if BM25Index.load(DB_SAVE_PATH) is None:
+            build_from_vectorstore(vector_store).save(DB_SAVE_PATH)
+        print("✅ 知识库无变化，无需重建。")
+        return stats
+
+    # 5. 保存到本地磁盘（先写索引，再写 manifest）
+    # index.faiss 始终保留 flat 原始向量，量化索引作为派生文件重新生成
     vector_store.save_local(DB_SAVE_PATH)
-    print(f"✅ 成功！数据库已保存至本地文件夹: ./{DB_SAVE_PATH}")
+    write_index_meta(DB_SAVE_PATH, embedding_signature(), vector_store.index.d)
+    # 其它类型的派生索引对应旧内容，一并删除（之后切换 KB_INDEX_TYPE 时按新内容重新生成）
+    remove_derived_indexes(DB_SAVE_PATH, keep=KB_INDEX_TYPE)
+    write_derived_index(vector_store, DB_SAVE_PATH, KB_INDEX_TYPE)
+    # 词法索引只做本地分词，全量重建也只需毫秒级
+    build_from_vectorstore(vector_store).save(DB_SAVE_PATH)
+    _save_manifest(new_files, DB_SAVE_PATH)
+    print(
+        f"✅ 成功！解析 {stats['parsed_files']} 个文件，新增 {stats['added_chunks']} 个片段，"
+        f"移除 {stats['removed_chunks']} 个片段，数据库已保存至: ./{DB_SAVE_PATH}"
+    )
+    return stats
 
 # --- 测试加载与检索 ---
 def test_query(query_text):
     print(f"\n🔍 测试检索: {query_text}")
-    
+
     # 重新加载 Embedding (用于查询)
-    embeddings = OpenAIEmbeddings(
-        base_url=OPENAI_BASE_URL,
-        api_key=OPENAI_API_KEY,
-        model=EMBEDDING_MODEL
-    )
-    
+    embeddings = get_embeddings()
+
     # 加载本地保存的数据库
     # allow_dangerous_deserialization=True 是为了加载 pickle 文件，确信文件是自己生成的即可
     new_vector_store = FAISS.load_local(
-        DB_SAVE_PATH, 
-        embeddings, 
+        DB_SAVE_PATH,
+        embeddings,
         allow_dangerous_deserialization=True
     )
-    
+
     # 执行相似度搜索
     results = new_vector_store.similarity_search(query_text, k=2)
-    
+
     for i, doc in enumerate(results):
         source = doc.metadata.get("source", "未知来源")
         content = doc.page_content[:100] + "..." # 只显示前100字
         print(f"   [结果 {i+1}] (来源: {source}):\n   {content}\n")
 
 if __name__ == "__main__":
-    # 第一步：建立数据库
-    create_vector_db()
-    
+    # 第一步：建立/增量更新数据库（传入 --full 强制全量重建）
+    create_vector_db(full_rebuild="--full" in sys.argv[1:])
+
     # 第二步：简单测试 (确保 person_basic_info 文件夹存在且有文件后再运行)
     # test_query("高血压防治的关键是什么？")
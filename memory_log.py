@@ -0,0 +1,140 @@
+"""
+多进程共享的短期记忆追加日志（SYSTEM_MEMORY_MODE=shared）。
+
+目录结构（位于 SYSTEM_MEMORY_PATH 下）::
+
+    index.faiss / index.pkl   快照（FAISS.save_local）
+    snapshot.json             {"generation": g, "offset": o} 快照已包含 events.<g>.log 的前 o 字节
+    events.<g>.log            追加日志，每行一条 JSON：id / content / metadata / embedding
+    embedding.json            生成快照与日志中向量的 embedding 签名与维度
+    .lock                     跨进程互斥锁文件
+
+写入方在排他锁内追加完整的一行；读取方无锁读取，只消费到最后一个换行符，
+因此不会读到半条记录。压缩（compaction）时写入新快照并切换到 generation+1 的新日志，
+仍持有旧 generation 的读取方发现旧日志消失后整体重新加载快照。
+快照先于 snapshot.json 写入，两者之间崩溃时 meta 的偏移会落后于快照；加载快照后的首次回放
+按记录 id 跳过快照中已有的记录（SystemMemoryManager._catch_up）。
+"""
+
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from serialization import dumps, dumps_bytes, loads
+
+SNAPSHOT_META = "snapshot.json"
+LOCK_FILE = ".lock"
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """跨进程排他锁：POSIX 使用 fcntl.flock，Windows 回退到 msvcrt.locking。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EventLog:
+    """单个 persist_path 对应的追加日志与快照元数据。"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock_path = os.path.join(root, LOCK_FILE)
+        self.meta_path = os.path.join(root, SNAPSHOT_META)
+
+    # ---- 快照元数据 ----
+    def read_meta(self) -> Dict[str, int]:
+        try:
+            with open(self.meta_path, "rb") as f:
+                meta = loads(f.read())
+            return {"generation": int(meta.get("generation", 0)), "offset": int(meta.get("offset", 0))}
+        except (OSError, ValueError):
+            return {"generation": 0, "offset": 0}
+
+    def write_meta(self, generation: int, offset: int) -> None:
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(dumps({"generation": generation, "offset": offset}))
+        os.replace(tmp, self.meta_path)
+
+    def log_path(self, generation: int) -> str:
+        return os.path.join(self.root, f"events.{generation}.log")
+
+    def lock(self):
+        return file_lock(self.lock_path)
+
+    # ---- 读写 ----
+    def append(self, generation: int, records: List[Dict[str, Any]]) -> int:
+        """追加记录（调用方需持有锁），返回追加后的日志末尾偏移。"""
+        data = b"".join(dumps_bytes(r) + b"\n" for r in records)
+        with open(self.log_path(generation), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def read_since(self, generation: int, offset: int) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """
+        读取 offset 之后的完整记录，返回 (records, new_offset)。
+        日志已被压缩切换（文件不存在）时返回 None，调用方需重新加载快照。
+        """
+        path = self.log_path(generation)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if size <= offset:
+            return [], offset
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(size - offset)
+        except OSError:
+            # getsize 之后被其它进程 rotate 删除
+            return None
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return [], offset
+        records = [loads(line) for line in chunk[: end + 1].splitlines() if line.strip()]
+        return records, offset + end + 1
+
+    def size(self, generation: int) -> int:
+        try:
+            return os.path.getsize(self.log_path(generation))
+        except OSError:
+            return 0
+
+    def rotate(self, old_generation: int) -> int:
+        """快照已写入后切换到新日志（调用方需持有锁），返回新 generation。"""
+        new_generation = old_generation + 1
+        open(self.log_path(new_generation), "ab").close()
+        self.write_meta(new_generation, 0)
+        try:
+            os.remove(self.log_path(old_generation))
+        except OSError:
+            pass
+        return new_generation
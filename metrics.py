@@ -0,0 +1,190 @@
+"""
+轻量级耗时埋点与 Prometheus 文本格式导出（无第三方依赖）。
+
+用法::
+
+    from metrics import span, traced, inc
+
+    @traced("memory_persist")
+    def _persist(self): ...
+
+    with span("llm"):
+        chain.invoke(payload)
+
+    inc("health_route_total", route="rag", risk_level="medium")
+
+METRICS_ENABLED=0 时 traced 直接返回原函数、span 返回共享的空上下文，几乎零开销。
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from config import METRICS_ENABLED
+
+STAGE_HISTOGRAM = "health_stage_duration_seconds"
+STAGE_ERRORS = "health_stage_errors_total"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_NULL_SPAN = nullcontext()
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label -> [各桶计数..., +Inf 计数, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[idx] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, row):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(key, (('le', repr(bound)),))} {cumulative}"
+                    )
+                cumulative += row[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {row[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text or name)
+            return self._metrics[name]  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text or name, buckets)
+            return self._metrics[name]  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_stage_histogram = registry.histogram(STAGE_HISTOGRAM, "各处理阶段耗时 (秒)")
+_stage_errors = registry.counter(STAGE_ERRORS, "各处理阶段异常次数")
+registry.counter("health_route_total", "路由结果计数 (按 route / risk_level)")
+
+
+# ------------------------------------------------------------------
+# 埋点接口
+# ------------------------------------------------------------------
+def observe(stage: str, seconds: float, **labels) -> None:
+    if METRICS_ENABLED:
+        _stage_histogram.observe(seconds, stage=stage, **labels)
+
+
+def inc(name: str, amount: float = 1.0, **labels) -> None:
+    if METRICS_ENABLED:
+        registry.counter(name).inc(amount, **labels)
+
+
+@contextmanager
+def _span(stage: str, labels: Dict[str, object]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        _stage_errors.inc(stage=stage, **labels)
+        raise
+    finally:
+        _stage_histogram.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def span(stage: str, **labels):
+    """记录代码块耗时到 health_stage_duration_seconds{stage=...}。"""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _span(stage, labels)
+
+
+def traced(stage: str, **labels) -> Callable[[Callable], Callable]:
+    """函数级埋点装饰器；关闭埋点时原样返回函数。"""
+
+    def decorator(fn: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(stage, labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_prometheus() -> str:
+    return registry.render()
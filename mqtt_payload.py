@@ -1,10 +1,27 @@
 from __future__ import annotations
 
 import json
+import threading
 from typing import Any, Dict, Optional
 
 from reminder_module import ReminderManager
 
+_default_manager: Optional[ReminderManager] = None
+_default_manager_lock = threading.Lock()
+
+
+def _get_default_manager() -> ReminderManager:
+    """
+    未传入 manager 时复用同一个只读 ReminderManager，避免每次构建 payload 都初始化。
+    它与 RiskRouter 的 manager 共用同一数据库的进程内缓存（reminder_module.shared_cache），
+    路由写入提醒后这里不会读到旧数据。
+    """
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = ReminderManager(enable_mqtt=False)
+        return _default_manager
+
 
 def _extract_message_text(raw_message: Any) -> Any:
     """
@@ -54,7 +71,7 @@ def build_mqtt_payload(
     reminder_entries = []
     reminder_ids = route_result.get("reminder_ids") or []
     if reminder_ids:
-        manager = reminder_manager or ReminderManager(enable_mqtt=False)
+        manager = reminder_manager or _get_default_manager()
         reminders = manager.get_reminders_by_ids(reminder_ids)
         reminder_entries = [
             {
@@ -0,0 +1,226 @@
+"""
+MQTT 客户端工厂与进程内 Broker 替身。
+
+config.MQTT_TRANSPORT:
+- paho: 连接真实 Broker（默认）；
+- local: 使用进程内 LocalBroker，离线压测/基准测试时无需外网。
+
+LocalClient 只实现本项目用到的 paho 接口子集（connect/subscribe/publish/loop_*），
+回调签名与 paho CallbackAPIVersion.VERSION2 保持一致。
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from config import LOCAL_BROKER_QUEUE_SIZE, MQTT_TRANSPORT
+
+logger = logging.getLogger("LocalBroker")
+logger.setLevel(logging.INFO)
+
+# on_message 回调异常的日志节流：首次及此后每 N 次记录一条
+CALLBACK_ERROR_LOG_EVERY = 100
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """支持 MQTT 通配符 + / #。"""
+    p_parts = pattern.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(p_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != "+" and part != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+@dataclass
+class LocalMessage:
+    topic: str
+    payload: bytes
+    qos: int = 0
+    retain: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class LocalPublishInfo:
+    rc: int = mqtt.MQTT_ERR_SUCCESS
+    mid: int = 0
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        return None
+
+    def is_published(self) -> bool:
+        return True
+
+
+class LocalBroker:
+    """进程内 Broker：每个订阅客户端一个有界队列，队列满时丢弃并计数。"""
+
+    def __init__(self, queue_size: int = LOCAL_BROKER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._clients: List["LocalClient"] = []
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "published": 0,
+            "delivered": 0,
+            "dropped": 0,
+            "callback_errors": 0,
+        }
+
+    def attach(self, client: "LocalClient") -> None:
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+
+    def detach(self, client: "LocalClient") -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, message: LocalMessage) -> None:
+        with self._lock:
+            targets = [c for c in self._clients if c.is_subscribed(message.topic)]
+            self.stats["published"] += 1
+        for client in targets:
+            try:
+                client.inbox.put_nowait(message)
+                delivered = True
+            except queue.Full:
+                delivered = False
+            with self._lock:
+                self.stats["delivered" if delivered else "dropped"] += 1
+
+    def record_callback_error(self) -> int:
+        """记录一次订阅端回调异常，返回累计次数。"""
+        with self._lock:
+            self.stats["callback_errors"] += 1
+            return self.stats["callback_errors"]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+
+class LocalClient:
+    def __init__(self, *args: Any, broker: Optional[LocalBroker] = None, **kwargs: Any):
+        self.broker = broker or local_broker()
+        self.inbox: "queue.Queue[Optional[LocalMessage]]" = queue.Queue(self.broker.queue_size)
+        self.on_connect: Optional[Callable] = None
+        self.on_message: Optional[Callable] = None
+        self._subscriptions: List[str] = []
+        self._sub_lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mid = 0
+        self._mid_lock = threading.Lock()
+
+    # ---- 连接 ----
+    def connect(self, host: str = "", port: int = 0, keepalive: int = 60, **kwargs: Any) -> int:
+        self.broker.attach(self)
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0, None)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def disconnect(self, *args: Any, **kwargs: Any) -> int:
+        self.broker.detach(self)
+        self.loop_stop()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic: str, qos: int = 0, **kwargs: Any):
+        with self._sub_lock:
+            if topic not in self._subscriptions:
+                self._subscriptions.append(topic)
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+
+    def is_subscribed(self, topic: str) -> bool:
+        with self._sub_lock:
+            return any(topic_matches(pattern, topic) for pattern in self._subscriptions)
+
+    # ---- 收发 ----
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False, **kwargs: Any):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif payload is None:
+            payload = b""
+        with self._mid_lock:
+            self._mid += 1
+            mid = self._mid
+        self.broker.publish(LocalMessage(topic=topic, payload=payload, qos=qos, retain=retain))
+        return LocalPublishInfo(mid=mid)
+
+    def _dispatch(self) -> None:
+        while self._running.is_set():
+            try:
+                message = self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if message is None:
+                # loop_stop 投递的唤醒信号
+                continue
+            if self.on_message:
+                try:
+                    self.on_message(self, None, message)
+                except Exception:
+                    # 与 paho 一样不让回调异常中断收包线程，但要留下记录
+                    count = self.broker.record_callback_error()
+                    if count == 1 or count % CALLBACK_ERROR_LOG_EVERY == 0:
+                        logger.exception(
+                            "on_message 回调异常（累计 %d 次）topic=%s", count, message.topic
+                        )
+
+    def loop_start(self) -> int:
+        if self._thread is None or not self._thread.is_alive():
+            self._running.set()
+            self._thread = threading.Thread(target=self._dispatch, daemon=True)
+            self._thread.start()
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, *args: Any) -> int:
+        self._running.clear()
+        try:
+            self.inbox.put_nowait(None)
+        except queue.Full:
+            pass
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_forever(self, *args: Any, **kwargs: Any) -> int:
+        self._running.set()
+        self._dispatch()
+        return mqtt.MQTT_ERR_SUCCESS
+
+
+_broker: Optional[LocalBroker] = None
+_broker_lock = threading.Lock()
+
+
+def local_broker() -> LocalBroker:
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = LocalBroker()
+        return _broker
+
+
+def create_client(client_id: Optional[str] = None, transport: Optional[str] = None):
+    """按 MQTT_TRANSPORT 创建 paho 客户端或进程内 LocalClient。"""
+    transport = transport or MQTT_TRANSPORT
+    if transport == "local":
+        return LocalClient(client_id)
+    if client_id:
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id)
+    return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
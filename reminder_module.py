@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import atexit
+import base64
 import json
 import logging
 import os
 import socket
 import sqlite3
-from dataclasses import dataclass, asdict
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
-import paho.mqtt.client as mqtt
 from langchain_community.utilities import SQLDatabase
 from langchain_core.tools import StructuredTool
 
@@ -17,10 +21,17 @@ from config import (
     DEFAULT_USER_ID,
     MQTT_BROKER,
     MQTT_PORT,
+    REMINDER_BATCH_MAX,
+    REMINDER_BATCH_WINDOW_MS,
+    REMINDER_CACHE_SIZE,
+    REMINDER_CACHE_TTL,
     REMINDER_DB_PATH,
     REMINDER_TOPIC,
 )
-from system_memory import SystemMemoryManager
+from metrics import inc, traced
+from mqtt_transport import create_client
+from serialization import dumps, dumps_bytes
+from system_memory import SystemMemoryManager, get_system_memory
 
 logger = logging.getLogger("ReminderModule")
 logger.setLevel(logging.INFO)
@@ -58,18 +69,331 @@ class Reminder:
         )
 
 
+# ------------------------------------------------------------------
+# Schema 迁移（PRAGMA user_version = 已执行的迁移数）
+# ------------------------------------------------------------------
+def _migrate_v1_sort_key(conn: sqlite3.Connection) -> None:
+    """
+    存储排序列 sort_key = COALESCE(due_time, created_at)，
+    并建立 (user_id, status, sort_key, id) 覆盖索引，供 keyset 分页使用。
+    v4 起排序改用整数列 sort_at，此列仅为兼容旧库保留，不再写入。
+    """
+    conn.execute("ALTER TABLE reminders ADD COLUMN sort_key TEXT")
+    conn.execute("UPDATE reminders SET sort_key = COALESCE(due_time, created_at)")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminders_user_status_sort
+        ON reminders (user_id, status, sort_key, id)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminders_user_sort
+        ON reminders (user_id, sort_key, id)
+        """
+    )
+
+
+def _migrate_v2_tags(conn: sqlite3.Connection) -> None:
+    """
+    规范化标签：reminder_tags(reminder_id, user_id, tag)，按 (user_id, tag, reminder_id) 建索引，
+    "某用户所有 heat / hydration 提醒" 变为索引查找；reminders.tags 逗号串保留用于展示。
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reminder_tags (
+            reminder_id INTEGER NOT NULL REFERENCES reminders(id) ON DELETE CASCADE,
+            user_id TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (reminder_id, tag)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminder_tags_user_tag
+        ON reminder_tags (user_id, tag, reminder_id)
+        """
+    )
+    rows = conn.execute(
+        "SELECT id, user_id, tags FROM reminders WHERE tags IS NOT NULL AND tags != ''"
+    ).fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO reminder_tags (reminder_id, user_id, tag) VALUES (?, ?, ?)",
+        [
+            (reminder_id, user_id, tag)
+            for reminder_id, user_id, tags in rows
+            for tag in normalize_tags(tags.split(","))
+        ],
+    )
+
+
+def _migrate_v3_dedupe_key(conn: sqlite3.Connection) -> None:
+    """幂等键：同一用户同一 dedupe_key 在冷却窗口内只保留一条未完成提醒。"""
+    conn.execute("ALTER TABLE reminders ADD COLUMN dedupe_key TEXT")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminders_dedupe
+        ON reminders (user_id, dedupe_key, created_at)
+        WHERE dedupe_key IS NOT NULL
+        """
+    )
+
+
+def to_epoch_ms(value: Any) -> Optional[int]:
+    """
+    datetime / ISO 字符串 / SQLite CURRENT_TIMESTAMP 文本 -> epoch 毫秒。
+    无时区的时间按 UTC 解释（系统内的 due_time 都由 datetime.utcnow() 推算）；无法解析返回 None。
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _migrate_v4_epoch_times(conn: sqlite3.Connection) -> None:
+    """
+    时间列改为整数 epoch 毫秒：due_at / created_ms / sort_at = COALESCE(due_at, created_ms)。
+    due_time 是 isoformat 文本（"T" 分隔、可能带微秒或时区），created_at 是 CURRENT_TIMESTAMP
+    （空格分隔），两者按字符串比较并不可靠；到期扫描、排序、分页与幂等窗口改走整数列上的索引。
+    文本列保留用于展示与 MQTT 负载。
+    """
+    conn.execute("ALTER TABLE reminders ADD COLUMN due_at INTEGER")
+    conn.execute("ALTER TABLE reminders ADD COLUMN created_ms INTEGER")
+    conn.execute("ALTER TABLE reminders ADD COLUMN sort_at INTEGER")
+    rows = conn.execute("SELECT id, due_time, created_at FROM reminders").fetchall()
+    backfill = []
+    for reminder_id, due_time, created_at in rows:
+        due_at = to_epoch_ms(due_time)
+        created_ms = to_epoch_ms(created_at) or 0
+        backfill.append((due_at, created_ms, due_at if due_at is not None else created_ms, reminder_id))
+    conn.executemany(
+        "UPDATE reminders SET due_at = ?, created_ms = ?, sort_at = ? WHERE id = ?", backfill
+    )
+    # 旧的文本列索引不再被查询使用，删除以减少写放大
+    for index in (
+        "idx_reminders_due",
+        "idx_reminders_user_status_sort",
+        "idx_reminders_user_sort",
+        "idx_reminders_dedupe",
+    ):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminders_status_due_at ON reminders (status, due_at)"
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminders_user_status_sort_at
+        ON reminders (user_id, status, sort_at, id)
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_sort_at ON reminders (user_id, sort_at, id)"
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_reminders_dedupe_ms
+        ON reminders (user_id, dedupe_key, created_ms)
+        WHERE dedupe_key IS NOT NULL
+        """
+    )
+
+
+SCHEMA_MIGRATIONS = [
+    _migrate_v1_sort_key,
+    _migrate_v2_tags,
+    _migrate_v3_dedupe_key,
+    _migrate_v4_epoch_times,
+]
+
+# 仍被视为"未完成"、可被幂等复用的状态
+OPEN_STATUSES = ("pending", "triggered")
+
+def normalize_tags(tags: Optional[List[str]]) -> List[str]:
+    """去空白、转小写、去重（保持顺序）。"""
+    seen: List[str] = []
+    for tag in tags or []:
+        tag = tag.strip().lower()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def _tag_filter(tags: List[str], user_id: Optional[str]) -> Tuple[str, List[Any]]:
+    """生成按标签过滤（任一标签命中）的 SQL 片段。"""
+    placeholders = ",".join("?" for _ in tags)
+    if user_id:
+        return (
+            f" AND id IN (SELECT reminder_id FROM reminder_tags WHERE user_id = ? AND tag IN ({placeholders}))",
+            [user_id, *tags],
+        )
+    return (
+        f" AND id IN (SELECT reminder_id FROM reminder_tags WHERE tag IN ({placeholders}))",
+        list(tags),
+    )
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_at: int, reminder_id: int) -> str:
+    """分页游标：上一页最后一行的 (sort_at, id)，对调用方不透明。"""
+    raw = json.dumps([sort_at, reminder_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        sort_at, reminder_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(sort_at), int(reminder_id)
+    except Exception as exc:
+        raise ValueError(f"无效的分页游标: {cursor!r}") from exc
+
+
+class ReminderCache:
+    """
+    进程内提醒读缓存：按 id 缓存 Reminder，并按用户缓存 pending 列表。
+    由 ReminderManager 的写操作（create / update_status，含 ReminderSync 同步）即时更新或失效；
+    其它进程的写入依赖 TTL 兜底。返回副本，调用方修改不会污染缓存。
+    """
+
+    def __init__(self, ttl: float = REMINDER_CACHE_TTL, max_size: int = REMINDER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._by_id: "OrderedDict[int, Tuple[float, Reminder]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[float, List[Reminder]]] = {}
+        self._lock = threading.Lock()
+        # 写代数：查询前取 token，回填时若期间发生过写入则放弃，避免旧行覆盖新状态
+        self._write_gen = 0
+        # 按用户的写代数：pending 列表回填与 watch_state 指纹只受该用户自己的写入影响
+        self._user_gen: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _count(self, kind: str, hit: bool) -> None:
+        self.stats["hits" if hit else "misses"] += 1
+        inc("reminder_cache_requests_total", kind=kind, result="hit" if hit else "miss")
+
+    def _fresh(self, stored_at: float) -> bool:
+        return time.monotonic() - stored_at < self.ttl
+
+    def token(self, user_id: Optional[str] = None) -> int:
+        """user_id 为 None 时返回全局写代数，否则返回该用户的写代数。"""
+        with self._lock:
+            if user_id is None:
+                return self._write_gen
+            return self._user_gen.get(user_id, 0)
+
+    # ---- 按 id ----
+    def get_many(self, ids: List[int]) -> Tuple[Dict[int, Reminder], List[int]]:
+        """返回 (命中的 {id: Reminder}, 未命中的 id 列表)。"""
+        found: Dict[int, Reminder] = {}
+        missing: List[int] = []
+        with self._lock:
+            for reminder_id in ids:
+                entry = self._by_id.get(reminder_id)
+                if entry is not None and self._fresh(entry[0]):
+                    self._by_id.move_to_end(reminder_id)
+                    found[reminder_id] = replace(entry[1])
+                    self._count("id", True)
+                else:
+                    missing.append(reminder_id)
+                    self._count("id", False)
+        return found, missing
+
+    def put(self, reminders: List[Reminder], token: Optional[int] = None) -> None:
+        """token 为 None 表示来自写操作的最新数据；否则是查询前取得的 token。"""
+        now = time.monotonic()
+        with self._lock:
+            if token is None:
+                self._write_gen += 1
+            elif token != self._write_gen:
+                return
+            for reminder in reminders:
+                self._by_id[reminder.id] = (now, replace(reminder))
+                self._by_id.move_to_end(reminder.id)
+            while len(self._by_id) > self.max_size:
+                self._by_id.popitem(last=False)
+
+    # ---- 按用户的 pending 列表 ----
+    def get_pending(self, user_id: str) -> Optional[List[Reminder]]:
+        with self._lock:
+            entry = self._pending.get(user_id)
+            hit = entry is not None and self._fresh(entry[0])
+            self._count("pending", hit)
+            return [replace(r) for r in entry[1]] if hit else None
+
+    def put_pending(self, user_id: str, reminders: List[Reminder], token: int) -> None:
+        """token 为查询前取得的 token(user_id)。"""
+        with self._lock:
+            if token != self._user_gen.get(user_id, 0):
+                return
+            self._pending[user_id] = (time.monotonic(), [replace(r) for r in reminders])
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            self._write_gen += 1
+            self._user_gen[user_id] = self._user_gen.get(user_id, 0) + 1
+            self._pending.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_id.clear()
+            self._pending.clear()
+
+
+_shared_caches: Dict[str, ReminderCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def shared_cache(db_path: str = REMINDER_DB_PATH) -> ReminderCache:
+    """按数据库文件返回进程内共享的 ReminderCache。"""
+    key = os.path.abspath(db_path)
+    with _shared_caches_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = _shared_caches[key] = ReminderCache()
+        return cache
+
+
 class ReminderMQTTPublisher:
-    """负责将提醒信息通过 MQTT 推送给终端。"""
+    """
+    负责将提醒信息通过 MQTT 推送给终端。
+
+    batch_window_ms > 0 时按用户合并推送：同一用户在窗口内的提醒事件攒成一条 batch 消息，
+    窗口到期或攒满 batch_max 条时发出；同一提醒在窗口内多次变化只保留最后一次（位置保持
+    首次出现的顺序）。窗口内只有一条事件时仍按单条格式发送，旧客户端不受影响。
+    """
 
     def __init__(
         self,
         broker: str = MQTT_BROKER,
         port: int = MQTT_PORT,
         topic: str = REMINDER_TOPIC,
+        batch_window_ms: float = REMINDER_BATCH_WINDOW_MS,
+        batch_max: int = REMINDER_BATCH_MAX,
     ):
         self.topic = topic
         self.source = os.getenv("REMINDER_SOURCE_ID", socket.gethostname())
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.batch_max = max(1, batch_max)
+        # user_id -> {reminder_id: (event, reminder payload)}；payload 在入队时生成快照
+        self._pending: Dict[str, "OrderedDict[Any, Tuple[str, Dict[str, Any]]]"] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._atexit_registered = False
+        self.client = create_client()
         self.available = True
         try:
             self.client.connect(broker, port, 60)
@@ -78,18 +402,92 @@ class ReminderMQTTPublisher:
             self.available = False
             logger.warning("MQTT 连接失败，改为本地模式: %s", exc)
 
+    @traced("mqtt_publish_reminder")
     def publish(self, reminder: Reminder, event: str) -> None:
         if not self.available:
             return
-        payload = {
-            "event": event,
-            "reminder": reminder.to_payload(),
-            "published_at": datetime.utcnow().isoformat(),
-            "source": self.source,
-        }
+        user_id = reminder.user_id
+        change = (event, reminder.to_payload())
+        if self.batch_window <= 0:
+            self._send(user_id, [change])
+            return
+
+        ready = None
+        with self._cond:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = OrderedDict()
+                self._deadlines[user_id] = time.monotonic() + self.batch_window
+            # 已存在的提醒原位覆盖：保持首次出现的顺序，只保留最后一次事件
+            pending[reminder.id] = change
+            if len(pending) >= self.batch_max:
+                ready = self._take(user_id)
+            else:
+                self._ensure_flusher()
+                self._cond.notify()
+        if ready:
+            self._send(user_id, ready)
+
+    def flush(self) -> None:
+        """立即发出所有未到期的批次（进程退出时自动调用）。"""
+        with self._cond:
+            batches = [(user_id, self._take(user_id)) for user_id in list(self._pending)]
+        for user_id, changes in batches:
+            self._send(user_id, changes)
+
+    # ------------------------------------------------------------------
+    # 合并窗口
+    # ------------------------------------------------------------------
+    def _take(self, user_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """调用方需持有 self._cond。"""
+        self._deadlines.pop(user_id, None)
+        return list(self._pending.pop(user_id, {}).values())
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._flush_loop, daemon=True, name="reminder-mqtt-batcher"
+            )
+            self._flusher.start()
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._deadlines:
+                        self._cond.wait()
+                        continue
+                    user_id, deadline = min(self._deadlines.items(), key=lambda kv: kv[1])
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                changes = self._take(user_id)
+            if changes:
+                self._send(user_id, changes)
+
+    def _send(self, user_id: str, changes: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if len(changes) == 1:
+            event, reminder_payload = changes[0]
+            payload: Dict[str, Any] = {"event": event, "reminder": reminder_payload}
+            kind = "single"
+        else:
+            payload = {
+                "event": "batch",
+                "user_id": user_id,
+                "changes": [{"event": event, "reminder": r} for event, r in changes],
+            }
+            kind = "batch"
+        payload["published_at"] = datetime.utcnow().isoformat()
+        payload["source"] = self.source
         try:
-            self.client.publish(self.topic, json.dumps(payload), retain=False)
-            logger.info("📣 MQTT 推送提醒: %s", payload)
+            self.client.publish(self.topic, dumps_bytes(payload), retain=False)
+            inc("reminder_mqtt_messages_total", kind=kind)
+            inc("reminder_mqtt_events_total", len(changes))
+            logger.info("📣 MQTT 推送提醒 (%s, %d 条): %s", kind, len(changes), payload)
         except Exception as exc:
             logger.error("MQTT 推送失败: %s", exc)
 
@@ -102,9 +500,12 @@ class ReminderManager:
         db_path: str = REMINDER_DB_PATH,
         enable_mqtt: bool = True,
         memory_manager: Optional[SystemMemoryManager] = None,
+        cache: Optional[ReminderCache] = None,
     ):
         self.db_path = db_path
-        self.memory = memory_manager or SystemMemoryManager()
+        self.memory = memory_manager or get_system_memory()
+        # 同一进程内指向同一数据库的 manager 共用缓存，任一实例的写入都能让其它实例的读缓存失效
+        self.cache = cache or shared_cache(db_path)
         self._init_schema()
         self.sql_db = SQLDatabase.from_uri(f"sqlite:///{self.db_path}")
         self.publisher = ReminderMQTTPublisher() if enable_mqtt else None
@@ -134,16 +535,33 @@ class ReminderManager:
                 )
                 """
             )
-            conn.execute(
-                """
-                CREATE INDEX IF NOT EXISTS idx_reminders_due
-                ON reminders (status, due_time)
-                """
-            )
+        # 索引统一由 SCHEMA_MIGRATIONS 维护
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """按 PRAGMA user_version 依次执行 SCHEMA_MIGRATIONS，多进程同时启动时由 BEGIN IMMEDIATE 串行。"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= len(SCHEMA_MIGRATIONS):
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for target, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    logger.info("提醒数据库已迁移到 v%d (%s)", target, migration.__name__)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
 
     # ------------------------------------------------------------------
     # CRUD
     # ------------------------------------------------------------------
+    @traced("reminder_create")
     def create_reminder(
         self,
         content: str,
@@ -153,32 +571,103 @@ class ReminderManager:
         due_time: Optional[datetime] = None,
         repeat_rule: Optional[str] = None,
         tags: Optional[List[str]] = None,
+        dedupe_key: Optional[str] = None,
+        dedupe_window: Optional[timedelta] = None,
     ) -> Reminder:
+        """
+        dedupe_key 非空时具备幂等性：若该用户在 dedupe_window 内已有同键且未完成
+        (pending / triggered) 的提醒，直接返回它，不再写库、写记忆或推送 MQTT。
+        查找与插入在同一个 BEGIN IMMEDIATE 事务内，多线程 / 多进程并发触发也只会创建一条。
+        """
         due_str = due_time.isoformat() if isinstance(due_time, datetime) else due_time
-        tag_str = ",".join(tags) if tags else None
+        due_at = to_epoch_ms(due_time)
+        now = datetime.now(timezone.utc)
+        created_ms = int(now.timestamp() * 1000)
+        tag_list = normalize_tags(tags)
+        tag_str = ",".join(tag_list) if tag_list else None
+
+        conn = self._connection()
+        conn.isolation_level = None
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedupe_key:
+                window_ms = int((dedupe_window or timedelta(0)).total_seconds() * 1000)
+                since = created_ms - window_ms
+                existing = conn.execute(
+                    f"""
+                    SELECT * FROM reminders
+                    WHERE user_id = ? AND dedupe_key = ? AND created_ms >= ?
+                      AND status IN ({",".join("?" for _ in OPEN_STATUSES)})
+                    ORDER BY id DESC LIMIT 1
+                    """,
+                    (user_id, dedupe_key, since, *OPEN_STATUSES),
+                ).fetchone()
+                if existing is not None:
+                    inc("reminder_dedupe_total", result="reused")
+                    return Reminder.from_row(existing)
+                inc("reminder_dedupe_total", result="created")
 
-        with self._connection() as conn:
             cur = conn.execute(
                 """
-                INSERT INTO reminders (user_id, content, severity, due_time, repeat_rule, tags)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO reminders
+                    (user_id, content, severity, due_time, repeat_rule, tags, created_at,
+                     dedupe_key, due_at, created_ms, sort_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (user_id, content, severity, due_str, repeat_rule, tag_str),
+                (
+                    user_id,
+                    content,
+                    severity,
+                    due_str,
+                    repeat_rule,
+                    tag_str,
+                    # 与 CURRENT_TIMESTAMP 相同的 UTC 文本格式，和 created_ms 取自同一时刻
+                    now.strftime("%Y-%m-%d %H:%M:%S"),
+                    dedupe_key,
+                    due_at,
+                    created_ms,
+                    due_at if due_at is not None else created_ms,
+                ),
             )
             reminder_id = cur.lastrowid
+            if tag_list:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO reminder_tags (reminder_id, user_id, tag) VALUES (?, ?, ?)",
+                    [(reminder_id, user_id, tag) for tag in tag_list],
+                )
             row = conn.execute(
                 "SELECT * FROM reminders WHERE id = ?", (reminder_id,)
             ).fetchone()
 
         reminder = Reminder.from_row(row)
+        self._cache_written(reminder)
         self.memory.log_reminder_event(user_id, reminder.id, "created", content)
         if self.publisher:
             self.publisher.publish(reminder, event="created")
         return reminder
 
+    @traced("reminder_list")
     def list_reminders(
-        self, *, status: Optional[str] = None, user_id: Optional[str] = None
+        self,
+        *,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        tags: Optional[List[str]] = None,
     ) -> List[Reminder]:
+        """tags 非空时只返回带有其中任一标签的提醒。"""
+        tag_list = normalize_tags(tags)
+        # 手表轮询的热点查询：某用户的 pending 列表
+        cacheable = (
+            self.cache.enabled and status == "pending" and user_id is not None and not tag_list
+        )
+        if cacheable:
+            cached = self.cache.get_pending(user_id)
+            if cached is not None:
+                return cached
+            # pending 列表只受该用户的写入影响；按 id 回填仍以全局写代数为准
+            user_token = self.cache.token(user_id)
+            token = self.cache.token()
+
         query = "SELECT * FROM reminders WHERE 1=1"
         params: List[Any] = []
         if status:
@@ -187,13 +676,64 @@ class ReminderManager:
         if user_id:
             query += " AND user_id = ?"
             params.append(user_id)
-        query += " ORDER BY COALESCE(due_time, created_at)"
+        if tag_list:
+            clause, tag_params = _tag_filter(tag_list, user_id)
+            query += clause
+            params.extend(tag_params)
+        query += " ORDER BY sort_at, id"
 
         with self._connection() as conn:
             rows = conn.execute(query, params).fetchall()
 
-        return [Reminder.from_row(row) for row in rows]
+        reminders = [Reminder.from_row(row) for row in rows]
+        if cacheable:
+            self.cache.put_pending(user_id, reminders, user_token)
+            self.cache.put(reminders, token)
+        return reminders
+
+    @traced("reminder_list_page")
+    def list_reminders_page(
+        self,
+        *,
+        status: Optional[str] = None,
+        user_id: str = DEFAULT_USER_ID,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+    ) -> Tuple[List[Reminder], Optional[str]]:
+        """
+        按 (sort_at, id) keyset 分页列出某用户的提醒，返回 (本页提醒, next_cursor)。
+        tags 非空时只返回带有其中任一标签的提醒（走 reminder_tags 索引）。
+        走 (user_id, status, sort_at, id) 索引，每页代价与历史总量无关；
+        next_cursor 为 None 表示没有更多。
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = "SELECT * FROM reminders WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        tag_list = normalize_tags(tags)
+        if tag_list:
+            clause, tag_params = _tag_filter(tag_list, user_id)
+            query += clause
+            params.extend(tag_params)
+        if cursor:
+            query += " AND (sort_at, id) > (?, ?)"
+            params.extend(decode_cursor(cursor))
+        query += " ORDER BY sort_at, id LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["sort_at"], rows[-1]["id"])
+        return [Reminder.from_row(row) for row in rows], next_cursor
 
+    @traced("reminder_update")
     def update_status(
         self,
         reminder_id: int,
@@ -212,36 +752,63 @@ class ReminderManager:
             ).fetchone()
 
         reminder = Reminder.from_row(row)
+        self._cache_written(reminder)
         self.memory.log_reminder_event(user_id, reminder_id, status, note)
         if self.publisher and propagate_mqtt:
             self.publisher.publish(reminder, event=status)
         return reminder
 
+    @traced("reminder_trigger_due")
     def trigger_due_reminders(self, now: Optional[datetime] = None) -> List[Reminder]:
-        now = now or datetime.utcnow()
-        iso_now = now.isoformat()
+        now_ms = to_epoch_ms(now or datetime.now(timezone.utc))
         with self._connection() as conn:
+            # (status, due_at) 索引范围扫描；整数比较不受 isoformat / 时区文本格式影响
             rows = conn.execute(
                 """
                 SELECT * FROM reminders
-                WHERE status = 'pending' AND due_time IS NOT NULL AND due_time <= ?
+                WHERE status = 'pending' AND due_at IS NOT NULL AND due_at <= ?
+                ORDER BY due_at
                 """,
-                (iso_now,),
+                (now_ms,),
             ).fetchall()
         reminders = [Reminder.from_row(row) for row in rows]
         for reminder in reminders:
             self.update_status(reminder.id, "triggered", user_id=reminder.user_id)
         return reminders
 
+    @traced("reminder_get")
     def get_reminders_by_ids(self, ids: List[int]) -> List[Reminder]:
         if not ids:
             return []
+        if not self.cache.enabled:
+            return self._fetch_by_ids(ids)
+
+        found, missing = self.cache.get_many(ids)
+        if missing:
+            token = self.cache.token()
+            fetched = self._fetch_by_ids(missing)
+            self.cache.put(fetched, token)
+            found.update((r.id, r) for r in fetched)
+        # 与 SQL IN 查询一致：按 id 升序、去重
+        return [found[i] for i in sorted(found)]
+
+    def _fetch_by_ids(self, ids: List[int]) -> List[Reminder]:
         placeholders = ",".join("?" for _ in ids)
         query = f"SELECT * FROM reminders WHERE id IN ({placeholders})"
         with self._connection() as conn:
             rows = conn.execute(query, ids).fetchall()
         return [Reminder.from_row(row) for row in rows]
 
+    def _cache_written(self, reminder: Reminder) -> None:
+        """写操作后刷新单条缓存，并让该用户的 pending 列表失效。"""
+        if self.cache.enabled:
+            self.cache.put([reminder])
+        # 用户写代数也是 watch_state 缓存指纹的一部分，缓存关闭（TTL=0）时同样要递增
+        self.cache.invalidate_user(reminder.user_id)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return dict(self.cache.stats)
+
     # ------------------------------------------------------------------
     # LangChain Tool 暴露
     # ------------------------------------------------------------------
@@ -249,15 +816,22 @@ class ReminderManager:
         def _create(content: str, due_time: Optional[str] = None) -> str:
             dt = datetime.fromisoformat(due_time) if due_time else None
             reminder = self.create_reminder(content=content, due_time=dt)
-            return json.dumps(reminder.to_payload(), ensure_ascii=False)
+            return dumps(reminder.to_payload())
 
-        def _list(status: Optional[str] = None) -> str:
-            reminders = self.list_reminders(status=status)
-            return json.dumps([r.to_payload() for r in reminders], ensure_ascii=False)
+        def _list(
+            status: Optional[str] = None,
+            limit: int = 20,
+            cursor: Optional[str] = None,
+            tags: Optional[List[str]] = None,
+        ) -> str:
+            reminders, next_cursor = self.list_reminders_page(
+                status=status, limit=limit, cursor=cursor, tags=tags
+            )
+            return dumps({"reminders": [r.to_payload() for r in reminders], "next_cursor": next_cursor})
 
         def _complete(reminder_id: int) -> str:
             reminder = self.update_status(reminder_id, "completed")
-            return json.dumps(reminder.to_payload(), ensure_ascii=False)
+            return dumps(reminder.to_payload())
 
         return [
             StructuredTool.from_function(
@@ -268,7 +842,12 @@ class ReminderManager:
             StructuredTool.from_function(
                 _list,
                 name="list_health_reminders",
-                description="查看用户的提醒列表，可根据 status 过滤 (pending/triggered/completed/ignored)",
+                description=(
+                    "分页查看用户的提醒列表，可根据 status 过滤 (pending/triggered/completed/ignored)。"
+                    "参数: status(optional), limit(默认 20), cursor(上一页返回的 next_cursor), "
+                    "tags(optional list，如 [\"heat\", \"hydration\"]，命中任一即返回)；"
+                    "返回 {reminders, next_cursor}，next_cursor 为 null 表示没有更多"
+                ),
             ),
             StructuredTool.from_function(
                 _complete,
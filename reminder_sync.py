@@ -1,15 +1,14 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
 import socket
 from typing import Optional
 
-import paho.mqtt.client as mqtt
-
 from config import DEFAULT_USER_ID, MQTT_BROKER, MQTT_PORT, REMINDER_TOPIC
+from mqtt_transport import create_client
 from reminder_module import ReminderManager
+from serialization import loads
 
 logger = logging.getLogger("ReminderSync")
 logger.setLevel(logging.INFO)
@@ -34,7 +33,7 @@ class ReminderSync:
         self.port = port
         self.topic = topic
         self.source_id = source_id or os.getenv("REMINDER_SOURCE_ID", socket.gethostname())
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client = create_client()
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
 
@@ -55,7 +54,7 @@ class ReminderSync:
 
     def _on_message(self, client, userdata, msg):
         try:
-            payload = json.loads(msg.payload.decode("utf-8"))
+            payload = loads(msg.payload)
         except Exception:
             logger.warning("ReminderSync 收到非 JSON 消息，忽略")
             return
@@ -64,7 +63,14 @@ class ReminderSync:
             return
 
         event = payload.get("event")
-        reminder = payload.get("reminder") or {}
+        if event == "batch":
+            # 合并推送：同一用户窗口内的多条变化，按顺序逐条应用
+            for change in payload.get("changes") or []:
+                self._apply_change(change.get("event"), change.get("reminder") or {})
+        else:
+            self._apply_change(event, payload.get("reminder") or {})
+
+    def _apply_change(self, event: Optional[str], reminder: dict) -> None:
         reminder_id = reminder.get("id")
         status = reminder.get("status") or event
         user_id = reminder.get("user_id") or DEFAULT_USER_ID
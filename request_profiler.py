@@ -0,0 +1,118 @@
+"""
+按需请求级性能剖析（cProfile）。
+
+触发方式（任一满足即剖析该请求）:
+- 请求头 `X-Profile: 1`（需 config.PROFILE_ALLOW_REQUEST_FLAG 开启）；
+- 查询参数 `?profile=1`（同上）；
+- 按 config.PROFILE_SAMPLE_RATE 随机采样。
+
+被剖析且带 @profiled 的接口会在 PROFILE_DIR 下生成 `<时间>_<路径>_<id>.prof`（可用 snakeviz /
+pstats 打开）以及同名 `.txt` 热点函数前 N 名摘要；文件确实写入后响应头 `X-Profile-File` 返回文件名。
+未被采样的请求只多一次 ContextVar 读取，没有剖析开销。
+
+接入::
+
+    app.middleware("http")(profiling_middleware)
+
+    @app.get("/api/watch_state")
+    @profiled
+    def get_watch_state(...): ...
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from config import PROFILE_ALLOW_REQUEST_FLAG, PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_TOP_N
+
+logger = logging.getLogger("RequestProfiler")
+logger.setLevel(logging.INFO)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY = "profile"
+
+# 当前请求的剖析状态 {"name", "written"}；None 表示不剖析。随 contextvars 传递到 FastAPI 线程池，
+# 线程池中复制的是同一个 dict，@profiled 写盘后置 written，中间件据此决定是否返回文件名
+_profile_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("profile_state", default=None)
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return value is not None and value.lower() in {"1", "true", "yes", "on"}
+
+
+def _should_profile(request) -> bool:
+    if PROFILE_ALLOW_REQUEST_FLAG:
+        if _truthy(request.headers.get(PROFILE_HEADER)):
+            return True
+        if _truthy(request.query_params.get(PROFILE_QUERY)):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _profile_name_for(path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S}_{slug}_{uuid.uuid4().hex[:8]}"
+
+
+async def profiling_middleware(request, call_next):
+    if not _should_profile(request):
+        return await call_next(request)
+
+    state = {"name": _profile_name_for(request.url.path), "written": False}
+    token = _profile_state.set(state)
+    try:
+        response = await call_next(request)
+    finally:
+        _profile_state.reset(token)
+    # 没有 @profiled 的路由（如 /metrics）不会生成文件，不返回文件名
+    if state["written"]:
+        response.headers["X-Profile-File"] = state["name"]
+    return response
+
+
+def _write_profile(profiler: cProfile.Profile, name: str) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    profiler.dump_stats(base + ".prof")
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+    buffer.write("\n")
+    stats.sort_stats("tottime").print_stats(PROFILE_TOP_N)
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(buffer.getvalue())
+    logger.info("🔬 请求剖析已保存: %s.prof / .txt", base)
+
+
+def profiled(fn: Callable) -> Callable:
+    """同步接口装饰器：在执行接口的线程内开启 cProfile（中间件只负责决定是否采样）。"""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        state = _profile_state.get()
+        if state is None:
+            return fn(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            try:
+                _write_profile(profiler, state["name"])
+                state["written"] = True
+            except Exception as exc:
+                logger.error("保存剖析结果失败 %s: %s", state["name"], exc)
+
+    return wrapper
@@ -0,0 +1,379 @@
+"""
+路由链路基准测试：离线运行 RiskRouter.route 与完整 /api/watch_state 流程。
+
+- embedding 使用本地后端 (默认 hashing)，LLM 使用 FakeListChatModel（可模拟延迟），
+  MQTT 使用进程内 LocalBroker，全部数据写入临时目录，不触碰仓库内的数据库。
+- 输出 low / medium / high 三个 Demo 场景的分阶段延迟（evaluate / retrieve / llm /
+  memory_write（入队）/ memory_add（后台写线程）/ memory_persist / reminder_create / payload_build / publish），
+  N 并发客户端下的吞吐，以及 M 次请求的内存增长，结果保存为 JSON，便于跨提交对比。
+
+用法:
+    python routing_benchmark.py                         # 默认参数，结果写入 bench_results/
+    python routing_benchmark.py --requests 50 --clients 1 4 8 --memory-requests 500
+    python routing_benchmark.py --compare bench_results/routing_abc123_xxx.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ("low", "medium", "high")
+
+
+# ------------------------------------------------------------------
+# 统计工具
+# ------------------------------------------------------------------
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    values = sorted(samples_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values), 3),
+        "p50_ms": round(_percentile(values, 50), 3),
+        "p95_ms": round(_percentile(values, 95), 3),
+        "p99_ms": round(_percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+class StageRecorder:
+    """替换目标对象上的方法为计时版本，按阶段收集耗时样本 (ms)。"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.samples[stage].append(elapsed_ms)
+
+    def wrap(self, owner: Any, attr: str, stage: str) -> None:
+        original: Callable = getattr(owner, attr)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, (time.perf_counter() - start) * 1000)
+
+        setattr(owner, attr, timed)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = defaultdict(list)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+# ------------------------------------------------------------------
+# 环境准备（必须在导入项目模块之前完成）
+# ------------------------------------------------------------------
+def _prepare_env(args: argparse.Namespace) -> str:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="routing_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["EMBEDDING_BACKEND"] = args.embedding
+    os.environ["MQTT_TRANSPORT"] = "local"
+    # Demo 场景的 state 每次相同，关闭结果缓存才能测到完整链路
+    os.environ["WATCH_STATE_CACHE_TTL"] = "0"
+    os.environ["SYSTEM_MEMORY_PATH"] = os.path.join(workdir, "system_memory_db")
+    os.environ["REMINDER_DB_PATH"] = os.path.join(workdir, "reminders.db")
+    os.environ["PERSON_KB_PATH"] = args.kb_path or os.path.join(workdir, "person_basic_info_db")
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return workdir
+
+
+def _build_kb() -> None:
+    import long_memory_storage
+
+    long_memory_storage.DATA_PATH = os.path.join(REPO_DIR, "person_basic_info")
+    long_memory_storage.create_vector_db()
+
+
+def _fake_llm(recorder: StageRecorder, latency_ms: float):
+    from langchain_community.chat_models.fake import FakeListChatModel
+
+    class TimedFakeChat(FakeListChatModel):
+        def invoke(self, input, config=None, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().invoke(input, config, **kwargs)
+            finally:
+                recorder.record("llm", (time.perf_counter() - start) * 1000)
+
+    return TimedFakeChat(
+        responses=['{"message": "保持补水与休息，关注近期睡眠", "evidence": {"note": "benchmark"}}'],
+        sleep=latency_ms / 1000 if latency_ms else None,
+    )
+
+
+def _instrument(watch_backend, recorder: StageRecorder, llm_latency_ms: float) -> None:
+    router = watch_backend.router
+    router.llm = _fake_llm(recorder, llm_latency_ms)
+    recorder.wrap(router, "route", "route")
+    recorder.wrap(router, "evaluate", "evaluate")
+    recorder.wrap(router.multi_memory, "retrieve", "retrieve")
+    recorder.wrap(router.system_memory, "add_event", "memory_write")
+    recorder.wrap(router.system_memory, "_write_batch", "memory_add")
+    recorder.wrap(router.system_memory, "_persist", "memory_persist")
+    recorder.wrap(router.reminder_manager, "create_reminder", "reminder_create")
+    if router.reminder_manager.publisher:
+        recorder.wrap(router.reminder_manager.publisher, "publish", "publish_reminder")
+    recorder.wrap(watch_backend, "build_mqtt_payload", "payload_build")
+    recorder.wrap(watch_backend, "send_llm_output", "publish_llm_output")
+
+
+# ------------------------------------------------------------------
+# 测量阶段
+# ------------------------------------------------------------------
+def _timed_call(fn: Callable, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_latency(watch_backend, recorder: StageRecorder, requests: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    router = watch_backend.router
+    for scenario in SCENARIOS:
+        recorder.reset()
+        route_ms = [
+            _timed_call(router.route, watch_backend.build_demo_state(scenario))
+            for _ in range(requests)
+        ]
+        # 短期记忆由后台线程写入，等其落地后再汇总 memory_add / memory_persist
+        router.system_memory.flush()
+        route_stages = recorder.summary()
+
+        recorder.reset()
+        watch_ms = [
+            _timed_call(watch_backend.compute_watch_state, user_id="bench_user", scenario=scenario)
+            for _ in range(requests)
+        ]
+        router.system_memory.flush()
+        results[scenario] = {
+            "route": summarize(route_ms),
+            "route_stages": route_stages,
+            "watch_state": summarize(watch_ms),
+            "watch_state_stages": recorder.summary(),
+        }
+    return results
+
+
+def run_throughput(watch_backend, clients: List[int], requests: int) -> List[Dict[str, Any]]:
+    rows = []
+    for n in clients:
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def client(idx: int) -> None:
+            local = []
+            for i in range(requests):
+                scenario = SCENARIOS[(idx + i) % len(SCENARIOS)]
+                local.append(
+                    _timed_call(
+                        watch_backend.compute_watch_state,
+                        user_id=f"bench_user_{idx}",
+                        scenario=scenario,
+                    )
+                )
+            with lock:
+                latencies.extend(local)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            list(pool.map(client, range(n)))
+        wall = time.perf_counter() - start
+        rows.append(
+            {
+                "clients": n,
+                "requests": n * requests,
+                "wall_s": round(wall, 3),
+                "throughput_rps": round(n * requests / wall, 2) if wall else 0.0,
+                "latency": summarize(latencies),
+            }
+        )
+    return rows
+
+
+def _rss_kb() -> Optional[int]:
+    try:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return None
+
+
+def run_memory(watch_backend, requests: int, samples: int = 10) -> Dict[str, Any]:
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    rss_start = _rss_kb()
+    curve = []
+    step = max(1, requests // samples)
+    for i in range(1, requests + 1):
+        watch_backend.compute_watch_state(
+            user_id="bench_user", scenario=SCENARIOS[i % len(SCENARIOS)]
+        )
+        if i % step == 0 or i == requests:
+            current, _ = tracemalloc.get_traced_memory()
+            curve.append({"requests": i, "traced_kb": round((current - base) / 1024, 1)})
+    watch_backend.router.system_memory.flush()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    growth_kb = (current - base) / 1024
+    return {
+        "requests": requests,
+        "traced_growth_kb": round(growth_kb, 1),
+        "traced_peak_kb": round((peak - base) / 1024, 1),
+        "growth_per_request_kb": round(growth_kb / requests, 3) if requests else 0.0,
+        "max_rss_kb_start": rss_start,
+        "max_rss_kb_end": _rss_kb(),
+        "curve": curve,
+    }
+
+
+# ------------------------------------------------------------------
+# 结果保存与对比
+# ------------------------------------------------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def _flatten(results: Dict[str, Any]) -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for scenario, data in results.get("latency", {}).items():
+        for kind in ("route", "watch_state"):
+            for key in ("p50_ms", "p95_ms"):
+                if key in data.get(kind, {}):
+                    flat[f"{scenario}.{kind}.{key}"] = data[kind][key]
+    for row in results.get("throughput", []):
+        flat[f"throughput.c{row['clients']}.rps"] = row["throughput_rps"]
+    memory = results.get("memory")
+    if memory:
+        flat["memory.growth_per_request_kb"] = memory["growth_per_request_kb"]
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old, new = _flatten(baseline), _flatten(current)
+    print(f"\n对比基线 {baseline_path} (commit={baseline.get('meta', {}).get('git_commit')})")
+    print(f"{'metric':<36}{'baseline':>12}{'current':>12}{'delta':>10}")
+    for key in sorted(set(old) & set(new)):
+        delta = ((new[key] - old[key]) / old[key] * 100) if old[key] else 0.0
+        print(f"{key:<36}{old[key]:>12.3f}{new[key]:>12.3f}{delta:>9.1f}%")
+
+
+def _print_summary(results: Dict[str, Any]) -> None:
+    for scenario, data in results["latency"].items():
+        print(f"\n[{scenario}] route p50={data['route'].get('p50_ms')}ms "
+              f"watch_state p50={data['watch_state'].get('p50_ms')}ms")
+        for stage, stats in data["watch_state_stages"].items():
+            print(f"    {stage:<20} n={stats['count']:<5} p50={stats['p50_ms']:>9}ms p95={stats['p95_ms']:>9}ms")
+    for row in results["throughput"]:
+        print(f"\nclients={row['clients']:<3} {row['throughput_rps']} req/s p95={row['latency'].get('p95_ms')}ms")
+    memory = results.get("memory")
+    if memory:
+        print(f"\nmemory: +{memory['traced_growth_kb']}KB over {memory['requests']} requests "
+              f"({memory['growth_per_request_kb']}KB/req)")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="RiskRouter / watch_state 基准测试")
+    parser.add_argument("--requests", type=int, default=20, help="每个场景的请求数")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8], help="并发客户端数")
+    parser.add_argument("--client-requests", type=int, default=10, help="每个并发客户端的请求数")
+    parser.add_argument("--memory-requests", type=int, default=200, help="内存增长测试的请求数")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="模拟 LLM 延迟")
+    parser.add_argument("--embedding", default="hashing", choices=["hashing", "fake", "sentence_transformers"])
+    parser.add_argument("--kb-path", help="复用已构建的知识库目录（需与 --embedding 一致）")
+    parser.add_argument("--no-kb", action="store_true", help="不构建知识库，retrieve 只查短期记忆")
+    parser.add_argument("--workdir", help="临时数据目录，默认自动创建")
+    parser.add_argument("--out", help="结果 JSON 路径，默认 bench_results/routing_<commit>_<time>.json")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    workdir = _prepare_env(args)
+    if not args.no_kb and not args.kb_path:
+        _build_kb()
+
+    import watch_backend
+
+    recorder = StageRecorder()
+    _instrument(watch_backend, recorder, args.llm_latency_ms)
+
+    # 预热：加载索引、建立 SQLite 文件等一次性开销不计入统计
+    for scenario in SCENARIOS:
+        watch_backend.compute_watch_state(user_id="bench_user", scenario=scenario)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workdir": workdir,
+            "args": vars(args),
+        }
+    }
+    results["latency"] = run_latency(watch_backend, recorder, args.requests)
+    results["throughput"] = run_throughput(watch_backend, args.clients, args.client_requests)
+    results["memory"] = run_memory(watch_backend, args.memory_requests)
+
+    out = args.out or os.path.join(
+        REPO_DIR,
+        "bench_results",
+        f"routing_{results['meta']['git_commit'] or 'nogit'}_{datetime.utcnow():%Y%m%d%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    _print_summary(results)
+    print(f"\n结果已保存: {out}")
+    if args.compare:
+        compare(results, args.compare)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-import json
 from dataclasses import dataclass
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
@@ -12,12 +12,18 @@ from langchain_openai import ChatOpenAI
 from config import (
     CHAT_MODEL,
     DEFAULT_USER_ID,
+    MACRO_COOLDOWN_MINUTES,
     OPENAI_API_KEY,
     OPENAI_BASE_URL,
+    RAG_KNOWLEDGE_CANDIDATES,
+    RAG_MEMORY_CANDIDATES,
 )
+from context_assembler import ContextAssembler
 from long_memory import MultiLayerMemory
+from metrics import inc, observe, span, traced
 from reminder_module import ReminderManager
 from system_memory import SystemMemoryManager
+from token_counter import count_tokens
 
 
 @dataclass
@@ -28,8 +34,23 @@ class RiskEvaluation:
 
 
 class CareMacroEngine:
-    def __init__(self, reminder_manager: ReminderManager):
+    """
+    高风险关怀宏。每条宏提醒带幂等键 "<宏>:<用途>"，冷却窗口内重复触发（手表轮询）
+    复用尚未完成的提醒，不再重复写库 / 写记忆 / 推送。
+    """
+
+    def __init__(
+        self,
+        reminder_manager: ReminderManager,
+        cooldown: timedelta = timedelta(minutes=MACRO_COOLDOWN_MINUTES),
+    ):
         self.reminder_manager = reminder_manager
+        self.cooldown = cooldown
+
+    def _create(self, content: str, *, dedupe_key: str, **kwargs: Any):
+        return self.reminder_manager.create_reminder(
+            content, dedupe_key=dedupe_key, dedupe_window=self.cooldown, **kwargs
+        )
 
     def run(self, evaluation: RiskEvaluation, state: Dict[str, Any]) -> Dict[str, Any]:
         macros = []
@@ -66,15 +87,17 @@ class CareMacroEngine:
     def _heat_macro(self, user_id: str) -> Dict[str, Any]:
         now = datetime.utcnow()
         reminders = [
-            self.reminder_manager.create_reminder(
+            self._create(
                 "未来 1 小时内补水 500ml，并避免正午外出",
+                dedupe_key="heat:hydration",
                 user_id=user_id,
                 severity="high",
                 due_time=now + timedelta(minutes=30),
                 tags=["heat", "hydration"],
             ),
-            self.reminder_manager.create_reminder(
+            self._create(
                 "联系家属确认状态，如持续不适请求医",
+                dedupe_key="heat:family",
                 user_id=user_id,
                 severity="high",
                 due_time=now + timedelta(hours=1),
@@ -92,15 +115,17 @@ class CareMacroEngine:
         if evening <= now:
             evening += timedelta(days=1)
         reminders = [
-            self.reminder_manager.create_reminder(
+            self._create(
                 "今晚 22:00 前完成放松活动（如听音乐/伸展），准备早睡",
+                dedupe_key="sleep:routine",
                 user_id=user_id,
                 severity="medium",
                 due_time=evening,
                 tags=["sleep", "routine"],
             ),
-            self.reminder_manager.create_reminder(
+            self._create(
                 "记录今晚睡眠时长与感受，明早确认",
+                dedupe_key="sleep:tracking",
                 user_id=user_id,
                 severity="low",
                 due_time=now + timedelta(hours=12),
@@ -158,10 +183,16 @@ class RiskRouter:
             ]
         )
         self.care_macro = CareMacroEngine(self.reminder_manager)
+        # 模板本身的 token 数计入预算
+        template_text = "\n".join(
+            m.content for m in self.rag_prompt.format_messages(state="", knowledge="", short_term="", profile="")
+        )
+        self.context_assembler = ContextAssembler(overhead_tokens=count_tokens(template_text))
 
     # ------------------------------------------------------------------
     # 风险计算
     # ------------------------------------------------------------------
+    @traced("evaluate")
     def evaluate(self, state: Dict[str, Any]) -> RiskEvaluation:
         score = 0
         reasons: List[str] = []
@@ -217,6 +248,7 @@ class RiskRouter:
     # 路由逻辑
     # ------------------------------------------------------------------
     def route(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
         evaluation = self.evaluate(state)
         user_id = state.get("user_id", DEFAULT_USER_ID)
         self.system_memory.add_event(
@@ -240,21 +272,26 @@ class RiskRouter:
             event_type="routing_result",
             importance=1.0,
         )
+        observe("route", time.perf_counter() - start, route=result["route"])
+        inc("health_route_total", route=result["route"], risk_level=evaluation.level)
         return result
 
     def _run_rag_path(self, evaluation: RiskEvaluation, state: Dict[str, Any]):
-        context = self.multi_memory.retrieve(state, user_id=state.get("user_id", DEFAULT_USER_ID))
-        payload = {
-            "state": json.dumps(state, ensure_ascii=False),
-            "knowledge": "\n".join(doc.page_content for doc in context.knowledge_snippets)
-            or "无",
-            "short_term": "\n".join(doc.page_content for doc in context.short_term_memory)
-            or "无",
-            "profile": context.user_profile or "无",
-        }
+        context = self.multi_memory.retrieve(
+            state,
+            user_id=state.get("user_id", DEFAULT_USER_ID),
+            k=RAG_KNOWLEDGE_CANDIDATES,
+            memory_k=RAG_MEMORY_CANDIDATES,
+        )
+        # 在 token 预算内挑选知识片段与短期记忆（去重、裁掉相邻片段重叠）
+        assembled = self.context_assembler.assemble(
+            state, context.knowledge_snippets, context.short_term_memory, context.user_profile
+        )
+        payload = assembled.prompt_vars()
         try:
             chain = self.rag_prompt | self.llm
-            response = chain.invoke(payload)
+            with span("llm"):
+                response = chain.invoke(payload)
             message = response.content if hasattr(response, "content") else str(response)
         except Exception as exc:
             message = f"无法调用模型，改为规则输出。原因: {exc}"
@@ -263,7 +300,7 @@ class RiskRouter:
             "route": "rag",
             "risk_level": evaluation.level,
             "message": message.strip(),
-            "evidence": payload,
+            "evidence": dict(payload, prompt_report=assembled.report),
         }
 
     def _run_template_path(self, evaluation: RiskEvaluation, state: Dict[str, Any]):
@@ -0,0 +1,83 @@
+"""
+传感器消息的有界摄入队列。
+
+MQTT 网络线程只把原始字节放进队列（O(1)，不解析 JSON），由工作线程池解析与处理，
+传感器洪峰不会阻塞 paho 的收发循环，内存占用也有上限。队列满时的溢出策略：
+
+    drop_oldest   丢弃最早入队的消息（FIFO 环形缓冲）
+    keep_latest   队列未满时与 drop_oldest 相同，逐条排队、不丢数据；队列已满时，同一设备
+                  已有待处理消息则原地替换其最新一条（保留该位置的入队时间），否则挤掉最早
+                  入队的消息。设备键由网络线程用正则从原始字节中提取 device_id，不做完整 JSON 解析。
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+OVERFLOW_POLICIES = ("drop_oldest", "keep_latest")
+
+_DEVICE_ID_RE = re.compile(rb'"device_id"\s*:\s*"([^"\\]*)"')
+
+
+def extract_device_id(payload: bytes) -> Optional[bytes]:
+    match = _DEVICE_ID_RE.search(payload)
+    return match.group(1) if match else None
+
+
+class IngestQueue:
+    """线程安全的有界队列；put 永不阻塞，返回本次因溢出被丢弃（或被替换）的消息数。"""
+
+    def __init__(self, maxsize: int, policy: str = "drop_oldest"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略 {policy!r}，可选 {'/'.join(OVERFLOW_POLICIES)}")
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        # 每个槽位为 [key, item, 入队时刻]；keep_latest 溢出时原地替换 item
+        self._slots: deque = deque()
+        # keep_latest：设备 -> 该设备最新一条仍在排队的槽位
+        self._latest: Dict[Hashable, list] = {}
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._slots)
+
+    def put(self, item: Any, key: Optional[Hashable] = None) -> int:
+        """入队；item 会与入队时刻 (time.monotonic()) 一起保存，供计算排队延迟。"""
+        now = time.monotonic()
+        dropped = 0
+        with self._cond:
+            if len(self._slots) >= self.maxsize:
+                dropped = 1
+                slot = self._latest.get(key) if key is not None else None
+                if slot is not None:
+                    # 同一设备的新消息覆盖其排队中的最新一条，入队时刻沿用原槽位
+                    slot[1] = item
+                    self._cond.notify()
+                    return dropped
+                self._forget(self._slots.popleft())
+            slot = [key, item, now]
+            self._slots.append(slot)
+            if self.policy == "keep_latest" and key is not None:
+                self._latest[key] = slot
+            self._cond.notify()
+        return dropped
+
+    def _forget(self, slot: list) -> None:
+        """槽位出队后不再参与合并（调用方需持有 self._cond）。"""
+        key = slot[0]
+        if key is not None and self._latest.get(key) is slot:
+            del self._latest[key]
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """取出 (item, 入队时刻)；超时返回 None。"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._slots, timeout):
+                return None
+            slot = self._slots.popleft()
+            self._forget(slot)
+            return slot[1], slot[2]
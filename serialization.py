@@ -0,0 +1,57 @@
+"""
+统一的 JSON 序列化入口（MQTT 推送 / FastAPI 响应 / 工具返回值 / RAG prompt / 日志）。
+
+安装了 orjson 时默认使用 orjson（直接产出 UTF-8 bytes，速度约为标准库的数倍），
+否则回退到标准库 json；可用 JSON_ENCODER=json 强制使用标准库。两种实现的输出约定一致：
+紧凑分隔符、非 ASCII 字符原样输出、datetime 转 ISO 字符串、其它无法编码的对象转 str。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from config import JSON_ENCODER
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：pip install orjson
+    orjson = None
+
+USE_ORJSON = orjson is not None and JSON_ENCODER in ("auto", "orjson")
+ENCODER_NAME = "orjson" if USE_ORJSON else "json"
+
+
+def _default(obj: Any) -> Any:
+    isoformat = getattr(obj, "isoformat", None)
+    if callable(isoformat):
+        return isoformat()
+    return str(obj)
+
+
+if USE_ORJSON:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any, *, sort_keys: bool = False) -> bytes:
+        option = _OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(data: Any) -> Any:
+        return orjson.loads(data)
+
+else:
+
+    def dumps_bytes(obj: Any, *, sort_keys: bool = False) -> bytes:
+        return dumps(obj, sort_keys=sort_keys).encode("utf-8")
+
+    def loads(data: Any) -> Any:
+        return json.loads(data)
+
+
+def dumps(obj: Any, *, sort_keys: bool = False) -> str:
+    if USE_ORJSON:
+        return dumps_bytes(obj, sort_keys=sort_keys).decode("utf-8")
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=_default
+    )
+
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import atexit
+import logging
 import os
+import pickle
+import queue
+import threading
+import uuid
 import warnings
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import faiss
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
 
@@ -25,17 +31,49 @@ warnings.filterwarnings(
 )
 
 from config import (
-    OPENAI_API_KEY,
-    OPENAI_BASE_URL,
-    EMBEDDING_MODEL,
+    MEMORY_EMBED_MIN_IMPORTANCE,
+    MEMORY_EMBED_POLICY,
+    MEMORY_INDEX_TYPE,
+    MEMORY_ROUTINE_EVENT_TYPES,
+    SYSTEM_EVENT_DB_PATH,
+    SYSTEM_MEMORY_COMPACT_EVERY,
+    SYSTEM_MEMORY_MODE,
     SYSTEM_MEMORY_PATH,
 )
+from embedding_backends import (
+    embedding_signature,
+    get_embeddings,
+    index_mismatch,
+    read_index_meta,
+    signature_of,
+    write_index_meta,
+)
+from event_log import StructuredEventLog
+from memory_log import EventLog
+from metrics import traced
+from token_counter import annotate
+from vector_index import ensure_index_type
+
+logger = logging.getLogger("SystemMemory")
+logger.setLevel(logging.INFO)
+
+WRITER_BATCH_SIZE = 64
+WRITER_EXIT_TIMEOUT = 10.0
 
 
 class SystemMemoryManager:
     """
     负责维护“短期时间线记忆”，并通过 LangChain 的 TimeWeightedVectorStoreRetriever
     提供时间感知的检索能力。可写入来自提醒模块与聊天模块的事件。
+
+    embed_policy="selective" 时所有事件写入结构化事件日志（event_log.StructuredEventLog），
+    只有显著事件（非例行类型，或 importance >= MEMORY_EMBED_MIN_IMPORTANCE）才 embedding 进 FAISS；
+    embed_policy="all" 保持每条事件都 embedding。
+    写入（add_event 等）只入队，由后台写线程批量 embedding 后短暂持锁加入索引，
+    需要确认写入已落地时调用 flush()。
+    mode="shared" 时多个进程（uvicorn workers）共用同一 persist_path：写入在文件锁内追加到
+    memory_log.EventLog（含 embedding），各进程从自己的日志偏移增量回放；
+    每 SYSTEM_MEMORY_COMPACT_EVERY 条写一次快照并切换日志，不再每次写入都 save_local。
     """
 
     def __init__(
@@ -44,27 +82,53 @@ class SystemMemoryManager:
         decay_rate: float = 0.01,
         k: int = 6,
         embeddings: Optional[Embeddings] = None,
+        index_type: str = MEMORY_INDEX_TYPE,
+        mode: str = SYSTEM_MEMORY_MODE,
+        compact_every: int = SYSTEM_MEMORY_COMPACT_EVERY,
+        embed_policy: str = MEMORY_EMBED_POLICY,
+        event_log_path: Optional[str] = SYSTEM_EVENT_DB_PATH,
     ):
         self.persist_path = persist_path
         self.decay_rate = decay_rate
         self.k = k
-        if embeddings is None and os.getenv("USE_FAKE_EMBEDDINGS") == "1":
-            from langchain_community.embeddings import FakeEmbeddings
-
-            embeddings = FakeEmbeddings(size=1536)
-
-        self.embeddings = embeddings or OpenAIEmbeddings(
-            base_url=OPENAI_BASE_URL, api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL
-        )
+        self.index_type = index_type
+        self.embeddings = embeddings or get_embeddings()
         self.vectorstore: Optional[FAISS] = None
         self.retriever: Optional[TimeWeightedVectorStoreRetriever] = None
-        self._load_or_init_store()
+        self.mode = mode
+        self.compact_every = max(1, compact_every)
+        self.embed_policy = embed_policy
+        self.event_log = StructuredEventLog(
+            event_log_path or os.path.join(persist_path, "event_log.db")
+        )
+        self._log: Optional[EventLog] = EventLog(persist_path) if mode == "shared" else None
+        self._generation = 0
+        self._log_offset = 0
+        self._since_snapshot = 0
+        # 写入由单个后台线程完成；self._lock 只保护内存中的索引结构（入索引 / 序列化 / 检索），
+        # embedding 计算与写盘都在锁外，检索不会排在它们后面
+        self._lock = threading.RLock()
+        self._queue: "queue.Queue[Union[Document, threading.Event]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._atexit_registered = False
+        # 已有索引与当前 embedding 不一致时置位，由 _rebuild_index 重建
+        self._stale_index = False
+        self._dedupe_replay = False
+        if self._log is not None:
+            with self._log.lock():
+                self._load_snapshot()
+                self._catch_up(locked=True)
+        else:
+            self._load_or_init_store()
+            if self._stale_index:
+                self._rebuild_index()
 
     # ------------------------------------------------------------------
     # 基础能力
     # ------------------------------------------------------------------
     def _load_or_init_store(self) -> None:
-        if os.path.isdir(self.persist_path):
+        if os.path.isfile(os.path.join(self.persist_path, "index.faiss")):
             try:
                 self.vectorstore = FAISS.load_local(
                     self.persist_path,
@@ -76,6 +140,14 @@ class SystemMemoryManager:
                 self.vectorstore = None
 
         if self.vectorstore is not None:
+            reason = index_mismatch(self.persist_path, self.vectorstore.index.d, self.embeddings)
+            if reason:
+                logger.warning("短期记忆索引与当前 embedding 不一致（%s），将按结构化事件日志重建", reason)
+                self.vectorstore = None
+                self._stale_index = True
+
+        if self.vectorstore is not None:
+            ensure_index_type(self.vectorstore, self.index_type)
             self._refresh_retriever()
             self._sync_memory_stream()
 
@@ -88,26 +160,73 @@ class SystemMemoryManager:
             )
             self.retriever.search_kwargs = {"score_threshold": 0, "k": max(self.k, 10)}
 
+    def _serialize(self) -> Optional[Tuple[bytes, bytes]]:
+        """在锁内把索引与 docstore 序列化到内存，真正的写盘放到锁外。"""
+        if not self.vectorstore:
+            return None
+        index_bytes = faiss.serialize_index(self.vectorstore.index).tobytes()
+        meta_bytes = pickle.dumps(
+            (self.vectorstore.docstore, self.vectorstore.index_to_docstore_id)
+        )
+        return index_bytes, meta_bytes
+
+    def _write_files(self, blobs: Tuple[bytes, bytes], dim: int) -> None:
+        """与 FAISS.save_local 相同的 index.faiss / index.pkl 布局，先写临时文件再原子替换。"""
+        os.makedirs(self.persist_path, exist_ok=True)
+        for name, data in zip(("index.faiss", "index.pkl"), blobs):
+            path = os.path.join(self.persist_path, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        write_index_meta(self.persist_path, signature_of(self.embeddings), dim)
+
+    @traced("memory_persist")
     def _persist(self) -> None:
-        if self.vectorstore:
-            os.makedirs(self.persist_path, exist_ok=True)
-            self.vectorstore.save_local(self.persist_path)
+        with self._lock:
+            blobs = self._serialize()
+            dim = self.vectorstore.index.d if self.vectorstore else 0
+        if blobs:
+            self._write_files(blobs, dim)
 
-    def _add_documents(self, documents: List[Document]) -> None:
-        if not documents:
-            return
-
-        if self.vectorstore is None:
-            self.vectorstore = FAISS.from_documents(documents, self.embeddings)
-            self._refresh_retriever()
-            self._sync_memory_stream()
+    def _rebuild_index(self) -> None:
+        """
+        丢弃与当前 embedding 不一致的旧向量，用结构化事件日志中曾 embedding 的事件重新生成索引
+        （shared 模式下调用方需持有文件锁；旧日志里的向量同样作废，重建后切换到新日志）。
+        """
+        self._stale_index = False
+        events = self.event_log.embedded_events()
+        records = []
+        if events:
+            vectors = self.embeddings.embed_documents([e["content"] for e in events])
+            records = [
+                {
+                    "id": uuid.uuid4().hex,
+                    "content": event["content"],
+                    "metadata": event["metadata"],
+                    "embedding": [float(x) for x in vector],
+                }
+                for event, vector in zip(events, vectors)
+            ]
+        with self._lock:
+            self.vectorstore = None
+            self.retriever = None
+            if records:
+                self._apply_records(records)
+            self._since_snapshot = 0
+        if records:
+            self._persist()
         else:
-            if self.retriever:
-                self.retriever.add_documents(documents)
-            else:
-                self.vectorstore.add_documents(documents)
-
-        self._persist()
+            for name in ("index.faiss", "index.pkl"):
+                try:
+                    os.remove(os.path.join(self.persist_path, name))
+                except OSError:
+                    pass
+        logger.info("短期记忆索引已按当前 embedding 重建：%d 条", len(records))
+        if self._log is not None:
+            generation = self._log.rotate(self._generation)
+            with self._lock:
+                self._generation = generation
+                self._log_offset = 0
 
     def _sync_memory_stream(self) -> None:
         """Ensure retriever memory_stream mirrors existing vectorstore docs."""
@@ -129,6 +248,216 @@ class SystemMemoryManager:
             self.retriever.memory_stream.append(doc)
         docstore._dict = {doc.id: doc for doc in docs}
 
+    def _apply_records(self, records: List[Dict[str, Any]]) -> None:
+        """把已含 embedding 的记录加入 FAISS 与 memory_stream（调用方需持有 self._lock）。"""
+        texts = [r["content"] for r in records]
+        vectors = [r["embedding"] for r in records]
+        ids = [r["id"] for r in records]
+        metadatas = [dict(r["metadata"]) for r in records]
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(
+                list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids
+            )
+            self._refresh_retriever()
+            self._sync_memory_stream()
+        else:
+            now = datetime.now()
+            stream = self.retriever.memory_stream if self.retriever else []
+            for i, metadata in enumerate(metadatas):
+                metadata.setdefault("last_accessed_at", now)
+                metadata["buffer_idx"] = len(stream) + i
+            stream.extend(
+                Document(page_content=text, metadata=metadata, id=doc_id)
+                for text, metadata, doc_id in zip(texts, metadatas, ids)
+            )
+            self.vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        # 条数达到训练阈值后切换到配置的索引类型（只追加，无需保留 flat 原始向量）
+        ensure_index_type(self.vectorstore, self.index_type)
+        self._since_snapshot += len(records)
+
+    # ------------------------------------------------------------------
+    # 单写线程
+    # ------------------------------------------------------------------
+    def _add_documents(self, documents: List[Document]) -> None:
+        """写入入队后立即返回；由后台写线程批量 embedding、入索引与落盘。"""
+        if not documents:
+            return
+        self._ensure_writer()
+        for document in documents:
+            self._queue.put(document)
+
+    def _ensure_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._writer_loop, daemon=True, name="system-memory-writer"
+                )
+                self._writer.start()
+                if not self._atexit_registered:
+                    atexit.register(self.flush, timeout=WRITER_EXIT_TIMEOUT)
+                    self._atexit_registered = True
+
+    def _writer_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITER_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            documents = [item for item in batch if isinstance(item, Document)]
+            if documents:
+                try:
+                    self._write_batch(documents)
+                except Exception as exc:
+                    logger.error("短期记忆写入失败 (%d 条): %s", len(documents), exc)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def should_embed(self, event_type: str, importance: float) -> bool:
+        """按事件类型与重要度决定是否需要语义检索（embedding 进 FAISS）。"""
+        if self.embed_policy == "all":
+            return True
+        if event_type not in MEMORY_ROUTINE_EVENT_TYPES:
+            return True
+        return importance >= MEMORY_EMBED_MIN_IMPORTANCE
+
+    @traced("memory_add")
+    def _write_batch(self, documents: List[Document]) -> None:
+        salient = [
+            doc
+            for doc in documents
+            if self.should_embed(
+                doc.metadata.get("event_type", ""), doc.metadata.get("importance", 1.0)
+            )
+        ]
+        salient_ids = {id(doc) for doc in salient}
+        self.event_log.append_many(
+            {
+                "user_id": doc.metadata.get("user_id", ""),
+                "event_type": doc.metadata.get("event_type", ""),
+                "content": doc.page_content,
+                "importance": doc.metadata.get("importance", 1.0),
+                "embedded": id(doc) in salient_ids,
+                "metadata": doc.metadata,
+                "created_at": doc.metadata.get("created_at"),
+            }
+            for doc in documents
+        )
+        if salient:
+            self._embed_and_index(salient)
+
+    def _embed_and_index(self, documents: List[Document]) -> None:
+        # embedding 在锁外完成，检索不会被模型调用阻塞
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        records = [
+            {
+                "id": uuid.uuid4().hex,
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "embedding": [float(x) for x in vector],
+            }
+            for doc, vector in zip(documents, vectors)
+        ]
+        if self._log is not None:
+            self._append_shared(records)
+            return
+        with self._lock:
+            self._apply_records(records)
+        self._persist()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前入队的写入全部落地（进入索引并写盘），超时返回 False。"""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # ------------------------------------------------------------------
+    # 多进程共享模式
+    # 锁顺序固定为 文件锁 -> self._lock，避免与读取方的刷新互相等待
+    # ------------------------------------------------------------------
+    def _load_snapshot(self) -> None:
+        """重新加载快照并定位到其对应的日志位置（调用方需持有文件锁）。"""
+        meta = self._log.read_meta()
+        with self._lock:
+            self.vectorstore = None
+            self.retriever = None
+            self._load_or_init_store()
+            self._generation = meta["generation"]
+            self._log_offset = meta["offset"]
+            self._since_snapshot = 0
+            # 快照写入后、rotate 写 meta 前崩溃时，meta 的偏移落后于快照内容；
+            # 加载快照后的第一次回放按记录 id 跳过快照中已有的记录
+            self._dedupe_replay = True
+        open(self._log.log_path(self._generation), "ab").close()
+        if self.vectorstore is None and not self._stale_index:
+            # 尚无快照时向量只在日志里，按写日志时记录的签名判断
+            meta = read_index_meta(self.persist_path)
+            signature = signature_of(self.embeddings)
+            if meta is not None and meta.get("signature") != signature:
+                logger.warning(
+                    "短期记忆日志由 %s 生成，当前为 %s，将按结构化事件日志重建",
+                    meta.get("signature"),
+                    signature,
+                )
+                self._stale_index = True
+        if self._stale_index:
+            self._rebuild_index()
+
+    def _catch_up(self, *, locked: bool) -> None:
+        """回放其它进程追加的日志记录；日志已被压缩切换时重新加载快照。"""
+        generation, offset = self._generation, self._log_offset
+        result = self._log.read_since(generation, offset)
+        if result is None:
+            if locked:
+                self._load_snapshot()
+            else:
+                with self._log.lock():
+                    if self._generation == generation:
+                        self._load_snapshot()
+            self._catch_up(locked=locked)
+            return
+        records, new_offset = result
+        with self._lock:
+            # 并发刷新时只有第一个线程生效，避免重复回放
+            if (self._generation, self._log_offset) != (generation, offset):
+                return
+            if records and self._dedupe_replay and self.vectorstore is not None:
+                known = set(self.vectorstore.index_to_docstore_id.values())
+                records = [r for r in records if r["id"] not in known]
+            self._dedupe_replay = False
+            if records:
+                self._apply_records(records)
+            self._log_offset = new_offset
+
+    def _append_shared(self, records: List[Dict[str, Any]]) -> None:
+        with self._log.lock():
+            self._catch_up(locked=True)
+            if read_index_meta(self.persist_path) is None:
+                # 日志中的向量同样要能识别来源，首次写入时补写元数据
+                write_index_meta(
+                    self.persist_path, signature_of(self.embeddings), len(records[0]["embedding"])
+                )
+            with self._lock:
+                self._log_offset = self._log.append(self._generation, records)
+                self._apply_records(records)
+                compact = self._since_snapshot >= self.compact_every
+            if compact:
+                self._persist()
+                generation = self._log.rotate(self._generation)
+                with self._lock:
+                    self._generation = generation
+                    self._log_offset = 0
+                    self._since_snapshot = 0
+
+    def refresh(self) -> None:
+        """shared 模式下拉取其它进程的新写入；local 模式无操作。"""
+        if self._log is not None:
+            self._catch_up(locked=False)
+
     # ------------------------------------------------------------------
     # 写入接口
     # ------------------------------------------------------------------
@@ -146,7 +475,7 @@ class SystemMemoryManager:
 
         调用方式示例::
 
-            mem = SystemMemoryManager()
+            mem = get_system_memory()
             mem.add_event(
                 user_id="user_001",
                 content="午后完成一次补水提醒",
@@ -170,6 +499,7 @@ class SystemMemoryManager:
         }
         if extra:
             metadata.update(extra)
+        annotate(metadata, content)
 
         document = Document(page_content=content, metadata=metadata)
         self._add_documents([document])
@@ -222,24 +552,116 @@ class SystemMemoryManager:
     # ------------------------------------------------------------------
     # 查询接口
     # ------------------------------------------------------------------
+    def _time_weighted_search(self, vector: List[float]) -> List[Document]:
+        """
+        与 TimeWeightedVectorStoreRetriever 相同的打分（最近 k 条 + 向量相关度 + 时间衰减），
+        但直接使用预先算好的查询向量，持锁期间只做索引查询与重排。
+        """
+        retriever = self.retriever
+        docs_and_scores = {
+            doc.metadata["buffer_idx"]: (doc, retriever.default_salience)
+            for doc in retriever.memory_stream[-retriever.k :]
+        }
+        relevance_fn = self.vectorstore._select_relevance_score_fn()
+        threshold = retriever.search_kwargs.get("score_threshold")
+        hits = self.vectorstore.similarity_search_with_score_by_vector(
+            vector, k=retriever.search_kwargs.get("k", 4)
+        )
+        for fetched, distance in hits:
+            relevance = relevance_fn(distance)
+            if threshold is not None and relevance < threshold:
+                continue
+            buffer_idx = fetched.metadata.get("buffer_idx")
+            if buffer_idx is not None and buffer_idx < len(retriever.memory_stream):
+                docs_and_scores[buffer_idx] = (retriever.memory_stream[buffer_idx], relevance)
+        return retriever._get_rescored_docs(docs_and_scores)
+
     def search_recent(
         self, query: str, user_id: Optional[str] = None, top_k: Optional[int] = None
     ) -> List[Document]:
+        self.refresh()
         if self.retriever is None:
             return []
 
-        try:
-            docs = self.retriever.invoke(query)
-        except AttributeError:
-            docs = self.retriever.get_relevant_documents(query)
+        vector = self.embeddings.embed_query(query)
+        with self._lock:
+            if self.retriever is None:
+                return []
+            docs = self._time_weighted_search(vector)
         if user_id:
             docs = [doc for doc in docs if doc.metadata.get("user_id") == user_id]
 
         limit = top_k or self.k
         return docs[:limit]
 
+    def recent_events(
+        self, user_id: Optional[str] = None, top_k: Optional[int] = None
+    ) -> List[Document]:
+        """
+        不调用 embedding 的短期记忆检索：从结构化事件日志按时间倒序取最近的显著事件
+        （即会被 embedding 进 FAISS 的那部分，与 search_recent 的候选范围一致）。
+        """
+        rows = self.event_log.query(user_id=user_id, embedded=True, limit=top_k or self.k)
+        return [Document(page_content=row["content"], metadata=row["metadata"]) for row in rows]
+
+    def query_events(
+        self,
+        *,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        按用户 / 类型 / 时间查询结构化事件日志（包含未 embedding 的例行事件），最近的在前。
+        since / until 为无时区时间时按 UTC 解释。
+        """
+        return self.event_log.query(
+            user_id=user_id, event_type=event_type, since=since, until=until, limit=limit
+        )
+
     def dump_all(self) -> List[Document]:
+        self.refresh()
         if self.vectorstore is None:
             return []
         # 使用 similarity_search("", k=n) 少数 trick 以取出所有
-        return self.vectorstore.similarity_search("", k=self.k)
+        vector = self.embeddings.embed_query("")
+        with self._lock:
+            if self.vectorstore is None:
+                return []
+            return self.vectorstore.similarity_search_by_vector(vector, k=self.k)
+
+
+# ------------------------------------------------------------------
+# 进程级共享实例
+# ------------------------------------------------------------------
+_registry: Dict[Tuple[str, str], SystemMemoryManager] = {}
+_registry_lock = threading.Lock()
+
+
+def _embeddings_key(embeddings: Optional[Embeddings]) -> str:
+    if embeddings is None:
+        return embedding_signature()
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return f"{type(embeddings).__module__}.{type(embeddings).__qualname__}:{model}"
+
+
+def get_system_memory(
+    persist_path: str = SYSTEM_MEMORY_PATH,
+    embeddings: Optional[Embeddings] = None,
+    **kwargs: Any,
+) -> SystemMemoryManager:
+    """
+    按 (persist_path, embedding 模型) 返回进程内唯一的 SystemMemoryManager。
+    同一路径只加载一次索引，也避免多个实例各自 save_local 互相覆盖。
+    kwargs 仅在首次创建时生效。
+    """
+    key = (os.path.abspath(persist_path), _embeddings_key(embeddings))
+    with _registry_lock:
+        manager = _registry.get(key)
+        if manager is None:
+            manager = _registry[key] = SystemMemoryManager(
+                persist_path, embeddings=embeddings, **kwargs
+            )
+        return manager
@@ -0,0 +1,54 @@
+"""/api/watch_state 按请求的 user_id 路由：不同用户取到各自的档案。"""
+
+import os
+import sys
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="watch_state_users_")
+os.environ.update(
+    {
+        "MQTT_TRANSPORT": "local",
+        "EMBEDDING_BACKEND": "hashing",
+        "USE_FAKE_EMBEDDINGS": "1",
+        "CONTEXT_TOKENIZER": "approx",
+        "PERSON_KB_PATH": os.path.join(_TMP, "kb"),
+        "SYSTEM_MEMORY_PATH": os.path.join(_TMP, "system_memory"),
+        "REMINDER_DB_PATH": os.path.join(_TMP, "reminders.db"),
+        "VITALS_DB_PATH": os.path.join(_TMP, "vitals.db"),
+        "USER_PROFILE_DIR": os.path.join(_TMP, "profiles"),
+        "USER_PROFILE_PATH": os.path.join(_TMP, "missing.txt"),
+    }
+)
+os.makedirs(os.environ["USER_PROFILE_DIR"])
+for _user, _name in (("user_a", "陈大文"), ("user_b", "李小美")):
+    with open(os.path.join(os.environ["USER_PROFILE_DIR"], f"{_user}.txt"), "w", encoding="utf-8") as _f:
+        _f.write(f"姓名： {_name}\n基本情况： 测试档案 {_user}\n")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import watch_backend  # noqa: E402
+
+
+def test_two_users_get_their_own_profile(monkeypatch):
+    retrievals = {}
+    original = watch_backend.router.multi_memory.retrieve
+
+    def capture(state, **kwargs):
+        context = original(state, **kwargs)
+        retrievals[kwargs["user_id"]] = context.to_dict()
+        return context
+
+    monkeypatch.setattr(watch_backend.router.multi_memory, "retrieve", capture)
+
+    payloads = {}
+    for user_id in ("user_a", "user_b"):
+        entry, _ = watch_backend.compute_watch_state(user_id, "medium")
+        payloads[user_id] = entry.payload
+
+    assert payloads["user_a"]["state"]["user_id"] == "user_a"
+    assert payloads["user_b"]["state"]["user_id"] == "user_b"
+    assert payloads["user_a"]["user_name"] == "陈大文"
+    assert payloads["user_b"]["user_name"] == "李小美"
+    assert "陈大文" in retrievals["user_a"]["user_profile"]
+    assert "李小美" in retrievals["user_b"]["user_profile"]
+    assert retrievals["user_a"]["user_profile"] != retrievals["user_b"]["user_profile"]
@@ -0,0 +1,82 @@
+"""
+Prompt token 计数。
+
+CONTEXT_TOKENIZER:
+    auto      安装了 tiktoken 且能加载 CHAT_MODEL 对应编码时精确计数，否则退回 approx
+    tiktoken  强制 tiktoken（加载失败同样退回 approx 并记录一次警告）
+    approx    估算：每个中日韩字符 / 全角符号记 1 token，其余字符每 4 个记 1 token
+
+知识库片段与短期记忆在写入时把 token 数存进 metadata["token_count"]（同时记录
+metadata["tokenizer"]），组装 prompt 时直接使用；计数器不一致时才重新计数。
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import CHAT_MODEL, CONTEXT_TOKENIZER
+
+logger = logging.getLogger("TokenCounter")
+logger.setLevel(logging.INFO)
+
+_WIDE_CHAR_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]")
+
+_counter: Optional[Tuple[str, Callable[[str], int]]] = None
+_counter_lock = threading.Lock()
+
+
+def _approx_count(text: str) -> int:
+    wide = len(_WIDE_CHAR_RE.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _load_counter() -> Tuple[str, Callable[[str], int]]:
+    if CONTEXT_TOKENIZER in ("auto", "tiktoken"):
+        try:
+            import tiktoken
+
+            try:
+                encoding = tiktoken.encoding_for_model(CHAT_MODEL)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+            return f"tiktoken:{encoding.name}", lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as exc:  # 未安装或离线无法下载编码文件
+            logger.warning("tiktoken 不可用，改用估算计数: %s", exc)
+    return "approx", _approx_count
+
+
+def _get_counter() -> Tuple[str, Callable[[str], int]]:
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = _load_counter()
+    return _counter
+
+
+def tokenizer_name() -> str:
+    return _get_counter()[0]
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return _get_counter()[1](text)
+
+
+def annotate(metadata: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """把 token 数写入 metadata（索引 / 写入记忆时调用）。"""
+    name, counter = _get_counter()
+    metadata["token_count"] = counter(text)
+    metadata["tokenizer"] = name
+    return metadata
+
+
+def stored_or_count(metadata: Dict[str, Any], text: str) -> int:
+    """优先使用写入时预先计算的 token 数。"""
+    if metadata.get("tokenizer") == tokenizer_name() and "token_count" in metadata:
+        return int(metadata["token_count"])
+    return count_tokens(text)
@@ -0,0 +1,161 @@
+"""
+按用户的档案存储：目录 USER_PROFILE_DIR 下每个用户一个 `<user_id>.txt`（格式同 person_basic_info/info.txt）。
+
+- 解析后的档案放在 LRU 缓存里（USER_PROFILE_CACHE_SIZE 个用户），请求路径上的查询是一次字典查找；
+- 同一用户最多每 USER_PROFILE_CHECK_INTERVAL 秒 stat 一次文件，(mtime_ns, size) 变化才重新读取解析，
+  文件不存在的结果同样缓存，未知用户不会每次都访问磁盘；
+- DEFAULT_USER_ID 没有独立档案时回退到旧的单文件 USER_PROFILE_PATH，其他用户不回退，
+  避免把同一位老人的档案套到所有用户上。
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from config import (
+    DEFAULT_USER_ID,
+    USER_PROFILE_CACHE_SIZE,
+    USER_PROFILE_CHECK_INTERVAL,
+    USER_PROFILE_DIR,
+    USER_PROFILE_PATH,
+)
+from metrics import inc
+
+# “姓名： 王淑珍” 这类单行字段（全角 / 半角冒号均可）
+_FIELD_RE = re.compile(r"^\s*([^\s:：\-][^:：]{0,15}?)\s*[:：]\s*(\S.*?)\s*$")
+_SAFE_USER_ID_RE = re.compile(r"^[\w.\-@]+$")
+
+Signature = Tuple[int, int]
+
+
+@dataclass
+class UserProfile:
+    user_id: str
+    text: str
+    fields: Dict[str, str] = field(default_factory=dict)
+    source: str = ""
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.fields.get("姓名") or self.fields.get("name")
+
+
+def parse_profile(user_id: str, text: str, source: str = "") -> UserProfile:
+    fields: Dict[str, str] = {}
+    for line in text.splitlines():
+        match = _FIELD_RE.match(line)
+        if match and match.group(1) not in fields:
+            fields[match.group(1)] = match.group(2)
+    return UserProfile(user_id=user_id, text=text, fields=fields, source=source)
+
+
+@dataclass
+class _Entry:
+    profile: Optional[UserProfile]
+    path: Optional[str]
+    signature: Optional[Signature]
+    checked_at: float
+
+
+class ProfileStore:
+    def __init__(
+        self,
+        root: str = USER_PROFILE_DIR,
+        default_path: Optional[str] = USER_PROFILE_PATH,
+        capacity: int = USER_PROFILE_CACHE_SIZE,
+        check_interval: float = USER_PROFILE_CHECK_INTERVAL,
+    ):
+        self.root = root
+        self.default_path = default_path
+        self.capacity = max(1, capacity)
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "checks": 0, "loads": 0}
+
+    def _candidates(self, user_id: str):
+        if _SAFE_USER_ID_RE.match(user_id):
+            yield os.path.join(self.root, f"{user_id}.txt")
+        if user_id == DEFAULT_USER_ID and self.default_path:
+            yield self.default_path
+
+    def _locate(self, user_id: str) -> Tuple[Optional[str], Optional[Signature]]:
+        for path in self._candidates(user_id):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return path, (st.st_mtime_ns, st.st_size)
+        return None, None
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                self._entries.move_to_end(user_id)
+                self.stats["hits"] += 1
+                inc("user_profile_requests_total", result="hit")
+                return entry.profile
+
+        # 到期复查：stat 一次，文件未变化则沿用已解析的档案
+        path, signature = self._locate(user_id)
+        if entry is not None and path == entry.path and signature == entry.signature:
+            profile = entry.profile
+            result = "check"
+        else:
+            profile = self._load(user_id, path) if path else None
+            result = "load"
+        with self._lock:
+            self._entries[user_id] = _Entry(profile, path, signature, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self.stats["checks" if result == "check" else "loads"] += 1
+        inc("user_profile_requests_total", result=result)
+        return profile
+
+    @staticmethod
+    def _load(user_id: str, path: str) -> Optional[UserProfile]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return parse_profile(user_id, f.read(), source=path)
+        except OSError:
+            return None
+
+    def get_text(self, user_id: str) -> Optional[str]:
+        profile = self.get(user_id)
+        return profile.text if profile else None
+
+    def display_name(self, user_id: str) -> str:
+        profile = self.get(user_id)
+        return (profile.name if profile else None) or user_id
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """档案被程序改写后可主动失效（否则最多 check_interval 秒后自动发现）。"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+# ------------------------------------------------------------------
+# 进程内单例
+# ------------------------------------------------------------------
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore()
+        return _store
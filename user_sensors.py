@@ -2,7 +2,13 @@ import json
 import random
 import logging
 import threading
-import paho.mqtt.client as mqtt
+import time
+
+from config import DEFAULT_USER_ID, SENSOR_QUEUE_POLICY, SENSOR_QUEUE_SIZE, SENSOR_WORKERS
+from metrics import inc, observe
+from mqtt_transport import create_client
+from sensor_ingest import IngestQueue, extract_device_id
+from vitals_store import get_vitals_store, to_epoch_ms
 
 # ==========================================
 # 1. 配置日志
@@ -53,9 +59,27 @@ class HealthMonitor(threading.Thread):
         # 3. 初始化数据存储
         self.current_heart_rate = None
         self.current_steps = None
+        self.current_sleep = None
+        self._latest_ts = None
+        self._state_lock = threading.Lock()
+
+        # 每条样本另存入时序库（缓冲后批量写入，不阻塞接收线程）
+        self.vitals_store = get_vitals_store()
+
+        # 网络线程只入队原始字节，解析与处理交给工作线程池
+        self.queue = IngestQueue(SENSOR_QUEUE_SIZE, SENSOR_QUEUE_POLICY)
+        self.counters = {"received": 0, "parsed": 0, "parse_errors": 0, "dropped": 0}
+        self._lag_sum = 0.0
+        self._lag_max = 0.0
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"sensor-worker-{i}")
+            for i in range(max(1, SENSOR_WORKERS))
+        ]
+        for worker in self._workers:
+            worker.start()
         
         # 4. 初始化 MQTT
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, CLIENT_ID)
+        self.client = create_client(CLIENT_ID)
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
 
@@ -80,19 +104,80 @@ class HealthMonitor(threading.Thread):
             logger.error(f"❌ 连接失败 code: {rc}")
 
     def _on_message(self, client, userdata, msg):
+        # 运行在 paho 网络线程：只做计数与入队，绝不解析或抛异常
+        payload = msg.payload
+        key = extract_device_id(payload) if self.queue.policy == "keep_latest" else None
+        dropped = self.queue.put(payload, key)
+        self._count("received")
+        if dropped:
+            self._count("dropped", dropped)
+
+    def _work(self):
+        while True:
+            payload, enqueued_at = self.queue.get()
+            lag = time.monotonic() - enqueued_at
+            try:
+                data = json.loads(payload)
+                metrics = data.get("metrics") or {}
+                if not isinstance(metrics, dict):
+                    raise ValueError("metrics 不是对象")
+                # ISO 字符串 / 非数字 / inf 等时间戳在这里按解析失败处理
+                ts = to_epoch_ms(data.get("timestamp"))
+            except Exception as e:
+                self._log_error("解析失败", e)
+                continue
+            try:
+                self._apply(data, metrics, ts)
+            except Exception as e:
+                # 任何单条消息的异常都不能结束工作线程，否则队列填满后后续样本全部丢弃
+                self._log_error("处理失败", e)
+                continue
+            self._count("parsed")
+            with self._state_lock:
+                self._lag_sum += lag
+                self._lag_max = max(self._lag_max, lag)
+            observe("sensor_queue_lag", lag)
+
+    def _log_error(self, what, error):
+        errors = self._count("parse_errors")
+        # 只记录第一条与此后每 1000 条，避免洪峰时刷屏
+        if errors == 1 or errors % 1000 == 0:
+            logger.warning(f"⚠️ 传感器消息{what}（累计 {errors} 条）: {error}")
+
+    def _apply(self, data, metrics, ts):
+        device_id = data.get("device_id") or DEFAULT_USER_ID
+        with self._state_lock:
+            # 多个工作线程并发处理时，只让时间戳更新的样本覆盖最新值
+            if self._latest_ts is None or ts >= self._latest_ts:
+                self._latest_ts = ts
+                self.current_heart_rate = metrics.get("heart_rate")
+                self.current_steps = metrics.get("steps")
+                self.current_sleep = metrics.get("sleep")
         try:
-            payload_str = msg.payload.decode('utf-8')
-            data = json.loads(payload_str)
-            metrics = data.get("metrics", {})
-            self.current_heart_rate = metrics.get("heart_rate")
-            self.current_steps = metrics.get("steps")
-            self.current_sleep = metrics.get("sleep")
-            # logger.info(f"收到数据: HR={self.current_heart_rate}")
-        except Exception:
-            pass
+            self.vitals_store.record(device_id, metrics, ts)
+        except Exception as e:
+            logger.error(f"❌ 写入时序库失败: {e}")
+
+    def _count(self, key, amount=1):
+        with self._state_lock:
+            self.counters[key] += amount
+            value = self.counters[key]
+        inc("sensor_messages_total", amount, result=key)
+        return value
+
+    def stats(self):
+        """摄入统计：收到 / 解析成功 / 解析失败 / 溢出丢弃、当前排队数与排队延迟。"""
+        with self._state_lock:
+            stats = dict(self.counters)
+            parsed = stats["parsed"]
+            stats["queue_depth"] = len(self.queue)
+            stats["lag_avg_ms"] = round(self._lag_sum / parsed * 1000, 3) if parsed else 0.0
+            stats["lag_max_ms"] = round(self._lag_max * 1000, 3)
+        return stats
 
     def get_latest_data(self):
-        return (self.current_heart_rate, self.current_steps, self.current_sleep)
+        with self._state_lock:
+            return (self.current_heart_rate, self.current_steps, self.current_sleep)
 
 # ==========================================
 # 4. 模块初始化
@@ -106,6 +191,10 @@ def get_user_sensors():
     """
     return _monitor.get_latest_data()
 
+def get_sensor_stats():
+    """摄入队列统计（/metrics 之外的快速查看，压测报告也会引用）"""
+    return _monitor.stats()
+
 # import json
 # import paho.mqtt.client as mqtt
 
@@ -0,0 +1,344 @@
+"""
+FAISS 索引类型管理：flat / ivf / hnsw / ivfpq / fp16。
+
+- 知识库 (person_basic_info_db)：`index.faiss` 始终保存为 flat 原始向量（增量更新、删除都在其上进行），
+  量化索引作为派生文件 `index_<type>.faiss` 保存，服务进程只加载派生索引以降低内存。
+- 短期记忆 (system_memory_db)：只追加不删除，条数达到训练阈值后原地转换为配置的索引类型。
+
+用法:
+    python vector_index.py rebuild kb --type ivfpq       # 生成知识库派生索引
+    python vector_index.py rebuild memory --type hnsw    # 原地转换短期记忆索引
+    python vector_index.py report kb                     # 输出 recall vs 延迟 报告
+    python vector_index.py report memory --k 5 --out report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from config import (
+    PERSON_KB_PATH,
+    SYSTEM_MEMORY_PATH,
+    VECTOR_INDEX_EF_SEARCH,
+    VECTOR_INDEX_HNSW_M,
+    VECTOR_INDEX_MIN_TRAIN,
+    VECTOR_INDEX_NPROBE,
+    VECTOR_INDEX_PQ_M,
+)
+
+logger = logging.getLogger("VectorIndex")
+logger.setLevel(logging.INFO)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "fp16")
+# 需要足量样本训练聚类中心 / 码本的索引类型
+TRAINED_TYPES = {"ivf", "ivfpq"}
+
+
+# ------------------------------------------------------------------
+# 索引识别与构建
+# ------------------------------------------------------------------
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16"
+    return "flat"
+
+
+def _factory_string(index_type: str, dim: int, ntotal: int) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "fp16":
+        return "SQfp16"
+    if index_type == "hnsw":
+        return f"HNSW{VECTOR_INDEX_HNSW_M}"
+
+    # faiss 建议每个聚类中心至少 39 个训练样本
+    nlist = max(1, min(int(4 * math.sqrt(max(ntotal, 1))), ntotal // 39))
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivfpq":
+        m = VECTOR_INDEX_PQ_M
+        while dim % m:
+            m -= 1
+        # 每个子量化器码本 2^nbits 个中心，同样按 39 倍样本量约束，样本少时降低位数
+        nbits = max(1, min(8, int(math.log2(max(ntotal // 39, 2)))))
+        return f"IVF{nlist},PQ{m}x{nbits}"
+    raise ValueError(f"未知索引类型: {index_type}，可选 {INDEX_TYPES}")
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """按索引类型构建并训练 L2 索引，向量顺序即 faiss 内部 id。"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dim = vectors.shape
+    index = faiss.index_factory(dim, _factory_string(index_type, dim, ntotal))
+    if not index.is_trained:
+        index.train(vectors)
+    if ntotal:
+        index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(
+    index: faiss.Index,
+    *,
+    nprobe: int = VECTOR_INDEX_NPROBE,
+    ef_search: int = VECTOR_INDEX_EF_SEARCH,
+) -> None:
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def reconstruct_vectors(index: faiss.Index) -> np.ndarray:
+    """取回索引中的全部向量（量化索引为近似值）。"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def convert_store(store: FAISS, index_type: str) -> FAISS:
+    """原地替换 store 的底层索引；向量顺序不变，index_to_docstore_id 无需调整。"""
+    if index_type_of(store.index) == index_type:
+        apply_search_params(store.index)
+        return store
+    vectors = reconstruct_vectors(store.index)
+    store.index = build_index(vectors, index_type)
+    return store
+
+
+def needs_training(index_type: str, ntotal: int) -> bool:
+    return index_type in TRAINED_TYPES and ntotal < VECTOR_INDEX_MIN_TRAIN
+
+
+def ensure_index_type(store: FAISS, index_type: str) -> bool:
+    """
+    若当前索引类型与配置不一致且样本量满足训练要求，则转换。
+    返回是否发生了转换。
+    """
+    current = index_type_of(store.index)
+    if current == index_type:
+        apply_search_params(store.index)
+        return False
+    if needs_training(index_type, store.index.ntotal):
+        return False
+    start = time.perf_counter()
+    convert_store(store, index_type)
+    logger.info(
+        "索引 %s -> %s 转换完成 (%d 条, %.1fs)",
+        current,
+        index_type,
+        store.index.ntotal,
+        time.perf_counter() - start,
+    )
+    return True
+
+
+# ------------------------------------------------------------------
+# 知识库派生索引
+# ------------------------------------------------------------------
+def derived_index_name(index_type: str) -> str:
+    return "index" if index_type == "flat" else f"index_{index_type}"
+
+
+def has_derived_index(folder_path: str, index_type: str) -> bool:
+    name = derived_index_name(index_type)
+    return all(
+        os.path.exists(os.path.join(folder_path, f"{name}.{ext}"))
+        for ext in ("faiss", "pkl")
+    )
+
+
+def remove_derived_indexes(folder_path: str, keep: Optional[str] = None) -> None:
+    """
+    删除 keep 以外所有类型的派生索引文件。知识库内容变化后，其它类型的派生文件
+    对应的是旧向量，留着会在切换 KB_INDEX_TYPE 时被加载。
+    """
+    for index_type in INDEX_TYPES:
+        if index_type == "flat" or index_type == keep:
+            continue
+        name = derived_index_name(index_type)
+        for ext in ("faiss", "pkl"):
+            try:
+                os.remove(os.path.join(folder_path, f"{name}.{ext}"))
+            except OSError:
+                pass
+
+
+def write_derived_index(store: FAISS, folder_path: str, index_type: str) -> None:
+    """基于 flat 原始向量生成派生索引文件，不修改 store 本身。"""
+    if index_type == "flat":
+        return
+    derived = FAISS(
+        embedding_function=store.embedding_function,
+        index=build_index(reconstruct_vectors(store.index), index_type),
+        docstore=store.docstore,
+        index_to_docstore_id=store.index_to_docstore_id,
+    )
+    derived.save_local(folder_path, index_name=derived_index_name(index_type))
+
+
+def delete_documents(store: FAISS, ids: Sequence[str]) -> None:
+    """
+    LangChain 的 FAISS.delete 假设删除后内部 id 连续（flat/fp16 满足）；
+    IVF 不会重排 id、HNSW 不支持删除，因此先转为 flat 删除再转换回去。
+    """
+    index_type = index_type_of(store.index)
+    if index_type in {"flat", "fp16"}:
+        store.delete(list(ids))
+        return
+    convert_store(store, "flat")
+    store.delete(list(ids))
+    convert_store(store, index_type)
+
+
+# ------------------------------------------------------------------
+# recall vs 延迟 报告
+# ------------------------------------------------------------------
+def _index_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def recall_report(
+    store: FAISS,
+    index_types: Sequence[str] = INDEX_TYPES,
+    *,
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    以 flat 精确检索为基准，对各索引类型统计 recall@k、单次查询延迟与索引体积。
+    查询向量取自库内向量并加入少量噪声，模拟“相近但不完全相同”的查询。
+    """
+    vectors = reconstruct_vectors(store.index)
+    ntotal = len(vectors)
+    if ntotal == 0:
+        return []
+    k = min(k, ntotal)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(ntotal, size=min(n_queries, ntotal), replace=False)
+    scale = float(np.std(vectors)) * 0.1
+    queries = vectors[picks] + rng.normal(0, scale, size=(len(picks), vectors.shape[1]))
+    queries = queries.astype(np.float32)
+
+    exact = build_index(vectors, "flat")
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        if needs_training(index_type, ntotal):
+            logger.warning("%s 需要至少 %d 条样本，当前 %d 条，仍强行训练", index_type, VECTOR_INDEX_MIN_TRAIN, ntotal)
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query.reshape(1, -1), k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        _, found = index.search(queries, k)
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+        rows.append(
+            {
+                "index_type": index_type,
+                "ntotal": ntotal,
+                "k": k,
+                "recall": round(hits / (len(queries) * k), 4),
+                "latency_ms": round(latency_ms, 4),
+                "index_bytes": _index_bytes(index),
+                "build_s": round(build_s, 3),
+            }
+        )
+    return rows
+
+
+def _print_report(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        print("索引为空，无法生成报告")
+        return
+    flat_bytes = next((r["index_bytes"] for r in rows if r["index_type"] == "flat"), None)
+    print(f"{'type':<8}{'recall@k':>10}{'latency(ms)':>14}{'size(MB)':>12}{'ratio':>8}{'build(s)':>10}")
+    for r in rows:
+        ratio = flat_bytes / r["index_bytes"] if flat_bytes else 0
+        print(
+            f"{r['index_type']:<8}{r['recall']:>10.4f}{r['latency_ms']:>14.4f}"
+            f"{r['index_bytes'] / 1e6:>12.2f}{ratio:>7.1f}x{r['build_s']:>10.3f}"
+        )
+
+
+# ------------------------------------------------------------------
+# 命令行
+# ------------------------------------------------------------------
+def _load_store(path: str, index_name: str = "index") -> FAISS:
+    # 离线操作只涉及已有向量，不需要真实 embedding 服务
+    from langchain_community.embeddings import FakeEmbeddings
+
+    return FAISS.load_local(
+        path,
+        FakeEmbeddings(size=1),
+        index_name=index_name,
+        allow_dangerous_deserialization=True,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="FAISS 索引转换与评估")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild", help="训练并保存指定类型索引")
+    rebuild.add_argument("store", choices=["kb", "memory"])
+    rebuild.add_argument("--type", required=True, choices=INDEX_TYPES)
+
+    report = sub.add_parser("report", help="输出 recall vs 延迟 报告")
+    report.add_argument("store", choices=["kb", "memory"])
+    report.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    report.add_argument("--k", type=int, default=10)
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--out", help="报告 JSON 保存路径")
+
+    args = parser.parse_args(argv)
+    path = PERSON_KB_PATH if args.store == "kb" else SYSTEM_MEMORY_PATH
+    store = _load_store(path)
+
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        if args.store == "kb":
+            write_derived_index(store, path, args.type)
+        else:
+            convert_store(store, args.type)
+            store.save_local(path)
+        print(
+            f"✅ {args.store} 已生成 {args.type} 索引 ({store.index.ntotal} 条, "
+            f"{time.perf_counter() - start:.1f}s) -> {path}"
+        )
+        return
+
+    rows = recall_report(store, args.types, k=args.k, n_queries=args.queries)
+    _print_report(rows)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+传感器生命体征的本地时序存储（SQLite，epoch 毫秒整数主键）。
+
+三个精度层级::
+
+    vitals_raw   每条原始样本          保留 VITALS_RAW_RETENTION_HOURS 小时
+    vitals_1m    1 分钟聚合            保留 VITALS_1M_RETENTION_DAYS 天
+    vitals_1h    1 小时聚合            保留 VITALS_1H_RETENTION_DAYS 天
+
+HealthMonitor 的接收线程只调用 record() 追加到内存缓冲；后台写线程按
+VITALS_FLUSH_INTERVAL 秒或 VITALS_BATCH_SIZE 条批量写入，同一事务内把这批样本
+增量汇总进 1m / 1h 层（UPSERT），因此降采样无需定时重扫原始表，原始层过期删除后
+聚合层仍可查询更长的趋势。
+
+查询按 (device_id, ts) 主键范围扫描（WITHOUT ROWID 表，数据按主键聚簇存放）。
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    VITALS_1H_RETENTION_DAYS,
+    VITALS_1M_RETENTION_DAYS,
+    VITALS_BATCH_SIZE,
+    VITALS_DB_PATH,
+    VITALS_FLUSH_INTERVAL,
+    VITALS_RAW_RETENTION_HOURS,
+)
+
+logger = logging.getLogger("VitalsStore")
+logger.setLevel(logging.INFO)
+
+MINUTE_MS = 60_000
+HOUR_MS = 3_600_000
+# 聚合层 -> 桶宽 (毫秒)
+ROLLUP_TIERS = {"1m": MINUTE_MS, "1h": HOUR_MS}
+RESOLUTIONS = ("raw",) + tuple(ROLLUP_TIERS)
+# resolution=auto 时按查询跨度选层：<= 2 小时原始，<= 3 天 1 分钟，否则 1 小时
+AUTO_RAW_MAX_SPAN_MS = 2 * HOUR_MS
+AUTO_1M_MAX_SPAN_MS = 3 * 24 * HOUR_MS
+PRUNE_INTERVAL = 600.0
+
+# (device_id, ts_ms, heart_rate, steps, sleep)
+Sample = Tuple[str, int, Optional[float], Optional[int], Optional[float]]
+
+
+def to_epoch_ms(value: Any) -> int:
+    """epoch 秒（设备上报格式）/ 毫秒 -> 毫秒整数；None 取当前时间。"""
+    if value is None:
+        return int(time.time() * 1000)
+    value = float(value)
+    # 小于 1e11 视为秒（1e11 秒约为公元 5138 年）
+    return int(value * 1000) if value < 1e11 else int(value)
+
+
+def _num(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def choose_resolution(start_ms: int, end_ms: int) -> str:
+    span_ms = end_ms - start_ms
+    if span_ms <= AUTO_RAW_MAX_SPAN_MS:
+        return "raw"
+    if span_ms <= AUTO_1M_MAX_SPAN_MS:
+        return "1m"
+    return "1h"
+
+
+class VitalsStore:
+    def __init__(
+        self,
+        db_path: str = VITALS_DB_PATH,
+        flush_interval: float = VITALS_FLUSH_INTERVAL,
+        batch_size: int = VITALS_BATCH_SIZE,
+    ):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_ms = {
+            "raw": int(VITALS_RAW_RETENTION_HOURS * HOUR_MS),
+            "1m": int(VITALS_1M_RETENTION_DAYS * 24 * HOUR_MS),
+            "1h": int(VITALS_1H_RETENTION_DAYS * 24 * HOUR_MS),
+        }
+
+        self._local = threading.local()
+        self._buffer: List[Sample] = []
+        self._cond = threading.Condition()
+        self._last_prune = 0.0
+        self._init_schema()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="vitals-writer", daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    # 连接与表结构
+    # ------------------------------------------------------------------
+    def _connection(self) -> sqlite3.Connection:
+        # 写线程与各查询线程各自一个连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vitals_raw (
+                    device_id TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    heart_rate REAL,
+                    steps INTEGER,
+                    sleep REAL,
+                    PRIMARY KEY (device_id, ts)
+                ) WITHOUT ROWID
+                """
+            )
+            for tier in ROLLUP_TIERS:
+                # steps 为当日累计值，取桶内最大；sleep 取桶内最后一次上报
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS vitals_{tier} (
+                        device_id TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        samples INTEGER NOT NULL,
+                        hr_count INTEGER NOT NULL,
+                        hr_sum REAL NOT NULL,
+                        hr_min REAL,
+                        hr_max REAL,
+                        steps_max INTEGER,
+                        sleep_last REAL,
+                        last_ts INTEGER NOT NULL,
+                        PRIMARY KEY (device_id, ts)
+                    ) WITHOUT ROWID
+                    """
+                )
+
+    # ------------------------------------------------------------------
+    # 写入：接收线程只入缓冲，写线程批量落库
+    # ------------------------------------------------------------------
+    def record(self, device_id: str, metrics: Dict[str, Any], timestamp: Any = None) -> None:
+        steps = _num(metrics.get("steps"))
+        sample: Sample = (
+            str(device_id),
+            to_epoch_ms(timestamp),
+            _num(metrics.get("heart_rate")),
+            int(steps) if steps is not None else None,
+            _num(metrics.get("sleep")),
+        )
+        with self._cond:
+            self._buffer.append(sample)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> None:
+        """立即把缓冲写入（测试或退出前调用）。"""
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write_batch(batch)
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+            try:
+                if batch:
+                    self._write_batch(batch)
+                if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    self.prune()
+            except Exception as e:  # 写入失败只记录，不影响接收线程
+                logger.error(f"写入生命体征失败（丢弃 {len(batch)} 条）: {e}")
+
+    def _write_batch(self, batch: List[Sample]) -> None:
+        conn = self._connection()
+        with conn:
+            # 重复上报（同一设备同一时间戳）只保留第一条，也不重复计入聚合层
+            inserted = [
+                sample
+                for sample in batch
+                if conn.execute(
+                    "INSERT OR IGNORE INTO vitals_raw (device_id, ts, heart_rate, steps, sleep) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    sample,
+                ).rowcount
+            ]
+            for tier, width in ROLLUP_TIERS.items():
+                self._rollup(conn, tier, width, inserted)
+
+    @staticmethod
+    def _rollup(conn: sqlite3.Connection, tier: str, width: int, samples: List[Sample]) -> None:
+        # 先在内存里按桶合并，再每桶一次 UPSERT
+        buckets: Dict[Tuple[str, int], List[Any]] = {}
+        for device_id, ts, hr, steps, sleep in samples:
+            key = (device_id, ts - ts % width)
+            row = buckets.get(key)
+            if row is None:
+                # [samples, hr_count, hr_sum, hr_min, hr_max, steps_max, sleep_last, last_ts]
+                row = buckets[key] = [0, 0, 0.0, None, None, None, None, ts]
+            row[0] += 1
+            if hr is not None:
+                row[1] += 1
+                row[2] += hr
+                row[3] = hr if row[3] is None else min(row[3], hr)
+                row[4] = hr if row[4] is None else max(row[4], hr)
+            if steps is not None:
+                row[5] = steps if row[5] is None else max(row[5], steps)
+            if sleep is not None and ts >= row[7]:
+                row[6] = sleep
+            row[7] = max(row[7], ts)
+
+        conn.executemany(
+            f"""
+            INSERT INTO vitals_{tier}
+                (device_id, ts, samples, hr_count, hr_sum, hr_min, hr_max, steps_max, sleep_last, last_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (device_id, ts) DO UPDATE SET
+                samples = samples + excluded.samples,
+                hr_count = hr_count + excluded.hr_count,
+                hr_sum = hr_sum + excluded.hr_sum,
+                hr_min = MIN(COALESCE(hr_min, excluded.hr_min), COALESCE(excluded.hr_min, hr_min)),
+                hr_max = MAX(COALESCE(hr_max, excluded.hr_max), COALESCE(excluded.hr_max, hr_max)),
+                steps_max = MAX(COALESCE(steps_max, excluded.steps_max), COALESCE(excluded.steps_max, steps_max)),
+                sleep_last = CASE
+                    WHEN excluded.sleep_last IS NOT NULL AND excluded.last_ts >= last_ts
+                    THEN excluded.sleep_last ELSE sleep_last END,
+                last_ts = MAX(last_ts, excluded.last_ts)
+            """,
+            [key + tuple(row) for key, row in buckets.items()],
+        )
+
+    def prune(self, now_ms: Optional[int] = None) -> Dict[str, int]:
+        """按各层保留时长删除过期数据，返回各层删除行数。"""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        removed: Dict[str, int] = {}
+        conn = self._connection()
+        with conn:
+            for tier in RESOLUTIONS:
+                cur = conn.execute(
+                    f"DELETE FROM vitals_{tier} WHERE ts < ?", (now_ms - self.retention_ms[tier],)
+                )
+                removed[tier] = cur.rowcount
+        self._last_prune = time.monotonic()
+        return removed
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def query(
+        self,
+        device_id: str,
+        start: Any = None,
+        end: Any = None,
+        resolution: str = "auto",
+        limit: int = 5000,
+    ) -> Dict[str, Any]:
+        """
+        查询 [start, end) 内的样本（start / end 为 epoch 秒或毫秒；默认最近 1 小时），按时间升序。
+        resolution: auto / raw / 1m / 1h。聚合点给出均值与最大最小心率、累计步数与最近睡眠时长。
+        """
+        end_ms = to_epoch_ms(end)
+        start_ms = to_epoch_ms(start) if start is not None else end_ms - HOUR_MS
+        if resolution == "auto":
+            resolution = choose_resolution(start_ms, end_ms)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution 必须是 auto 或 {'/'.join(RESOLUTIONS)}，收到 {resolution!r}")
+
+        conn = self._connection()
+        if resolution == "raw":
+            rows = conn.execute(
+                "SELECT ts, heart_rate, steps, sleep FROM vitals_raw "
+                "WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+                (device_id, start_ms, end_ms, limit),
+            ).fetchall()
+            points = [dict(row) for row in rows]
+        else:
+            rows = conn.execute(
+                f"SELECT ts, samples, hr_count, hr_sum, hr_min, hr_max, steps_max, sleep_last "
+                f"FROM vitals_{resolution} WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+                (device_id, start_ms - start_ms % ROLLUP_TIERS[resolution], end_ms, limit),
+            ).fetchall()
+            points = [
+                {
+                    "ts": row["ts"],
+                    "heart_rate": round(row["hr_sum"] / row["hr_count"], 1) if row["hr_count"] else None,
+                    "heart_rate_min": row["hr_min"],
+                    "heart_rate_max": row["hr_max"],
+                    "steps": row["steps_max"],
+                    "sleep": row["sleep_last"],
+                    "samples": row["samples"],
+                }
+                for row in rows
+            ]
+        return {
+            "device_id": device_id,
+            "resolution": resolution,
+            "start": start_ms,
+            "end": end_ms,
+            "points": points,
+        }
+
+    def latest(self, device_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT ts, heart_rate, steps, sleep FROM vitals_raw WHERE device_id = ? ORDER BY ts DESC LIMIT 1",
+            (device_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+# ------------------------------------------------------------------
+# 进程内单例（HealthMonitor 写入、watch_backend 查询共用）
+# ------------------------------------------------------------------
+_store: Optional[VitalsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_vitals_store() -> VitalsStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VitalsStore()
+        return _store
@@ -1,33 +1,63 @@
 # watch_backend.py
 import time
 from datetime import datetime
+from typing import Any, Optional, Tuple
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import uvicorn
 
-from hko_weather_info import get_hko_weather
+from hko_weather_info import get_user_weather
 from routing_engine import RiskRouter
 from user_sensors import get_user_sensors
 from mqtt_payload import build_mqtt_payload
 from llm_output_sender import send_llm_output
 from reminder_sync import start_reminder_sync
+from metrics import inc, render_prometheus, span, traced
+from request_profiler import profiled, profiling_middleware
+from serialization import dumps_bytes
+from user_profiles import get_profile_store
+from vitals_store import get_vitals_store
+from watch_state_cache import CachedWatchState, WatchStateCache, etag_matches, state_fingerprint
+
+
+# ======== JSON 响应：统一走 serialization.dumps_bytes ========
+class JSONBytesResponse(Response):
+    """
+    FastAPI 响应类：content 为 bytes 时视为已序列化的 JSON 原样发送（如缓存中的响应体），
+    否则用 dumps_bytes 编码，绕过 FastAPI 默认的 jsonable_encoder + json.dumps。
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return bytes(content)
+        return dumps_bytes(content)
 
 
 # ======== 实时状态：从传感器 + 天气 API 取数 ========
-def build_state():
+@traced("build_state")
+def build_state(user_id: str = "user_001"):
     # 等待传感器线程拉取到最新数据（你原来的逻辑）
-    time.sleep(2)
+    with span("sensor_wait"):
+        time.sleep(2)
     heart_rate, steps, sleep = get_user_sensors()
-    temperature, humidity, warnings = get_hko_weather()
+    with span("hko_weather"):
+        # 全港快照每 HKO_WEATHER_TTL 秒请求一次，按用户档案位置取最近站点
+        weather = get_user_weather(user_id)
 
     return {
-        "user_id": "user_001",
+        "user_id": user_id,
         "timestamp": datetime.utcnow().isoformat(),
         "weather": {
-            "temperature": temperature,
-            "humidity": humidity,
-            "warnings": warnings,
+            "temperature": weather.temperature,
+            "humidity": weather.humidity,
+            "warnings": weather.warnings,
+            "station": weather.station,
+            "humidity_station": weather.humidity_station,
+            "rainfall": weather.rainfall,
         },
         "vitals": {"heart_rate": heart_rate, "steps": steps, "sleep": sleep},
         "notes": "自动测试样例（实时数据）",
@@ -35,7 +65,7 @@ def build_state():
 
 
 # ======== Demo 状态： high / medium / low 三个场景 ========
-def build_demo_state(scenario: str):
+def build_demo_state(scenario: str, user_id: str = "user_001"):
     """
     用你在 main 里写过的 state_high / state_medium / state_low，
     方便前端演示不同风险等级。
@@ -43,7 +73,7 @@ def build_demo_state(scenario: str):
     if scenario == "high":
         # 高风险示例
         return {
-            "user_id": "user_001",
+            "user_id": user_id,
             "timestamp": datetime.utcnow().isoformat(),
             "weather": {"temperature": 35, "humidity": None, "warnings": ["WHOT"]},
             "vitals": {"heart_rate": 115, "steps": 1800, "sleep": 5.5},
@@ -53,7 +83,7 @@ def build_demo_state(scenario: str):
     if scenario == "medium":
         # 你之前写的 state_medium 示例
         return {
-            "user_id": "user_001",
+            "user_id": user_id,
             "timestamp": datetime.utcnow().isoformat(),
             "weather": {
                 "temperature": 32,   # 4 分
@@ -71,7 +101,7 @@ def build_demo_state(scenario: str):
     if scenario == "low":
         # 你之前写的 state_low 示例
         return {
-            "user_id": "user_001",
+            "user_id": user_id,
             "timestamp": datetime.utcnow().isoformat(),
             "weather": {"temperature": 24, "humidity": None, "warnings": []},
             "vitals": {"heart_rate": 78, "steps": 2500, "sleep": 7.2},
@@ -79,11 +109,13 @@ def build_demo_state(scenario: str):
         }
 
     # 兜底：如果传了奇怪的 scenario，就退回实时数据
-    return build_state()
+    return build_state(user_id)
 
 
 # ======== 初始化你的 router ========
 router = RiskRouter()
+# state 未变化的轮询直接复用上次结果（不重复路由 / 写记忆 / 推送）
+watch_state_cache = WatchStateCache()
 
 # ======== FastAPI 实例 ========
 app = FastAPI()
@@ -97,42 +129,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按需剖析：X-Profile 头 / ?profile=1 / PROFILE_SAMPLE_RATE 采样
+app.middleware("http")(profiling_middleware)
+
 
 # ======== 启动时顺便启动 reminder 同步（如果你需要一直收提醒） ========
 @app.on_event("startup")
 def on_startup():
     # 如果 start_reminder_sync 内部自己起线程/协程，这里调用一次就好
     try:
-        start_reminder_sync()
+        # 与 router 共用同一个 ReminderManager（及其短期记忆）
+        start_reminder_sync(router.reminder_manager)
         print("[watch_backend] reminder_sync started.")
     except Exception as e:
         print("[watch_backend] start_reminder_sync failed:", e)
 
 
 # ======== 核心接口：前端就是调这个 ========
-@app.get("/api/watch_state")
-def get_watch_state(
-    user_id: str = "user_001",
-    scenario: str = "live",   # 新增参数：live / high / medium / low
-):
+def compute_watch_state(user_id: str = "user_001", scenario: str = "live") -> Tuple[CachedWatchState, bool]:
     """
-    调用方式示例：
-      实时数据： http://localhost:8000/api/watch_state?user_id=user_001
-      high demo: http://localhost:8000/api/watch_state?user_id=user_001&scenario=high
-      low  demo: http://localhost:8000/api/watch_state?user_id=user_001&scenario=low
+    返回 (缓存条目, cache_hit)；条目含 engine_payload、已序列化的响应体与 ETag。
+    state 与上次相比（忽略 timestamp）没有变化、且提醒没有新写入时，直接返回缓存的 payload。
     """
 
     # 1. 选择 state 来源：实时 or demo
     if scenario == "live":
-        state = build_state()
+        state = build_state(user_id)
     else:
-        state = build_demo_state(scenario)
+        state = build_demo_state(scenario, user_id)
+
+    cache_key = (user_id, scenario)
+    # 档案里的姓名改动也要让缓存失效（ProfileStore 命中时是一次字典查找）
+    user_name = get_profile_store().display_name(user_id)
+    fingerprint = state_fingerprint(state, (router.reminder_manager.cache.token(user_id), user_name))
+    if watch_state_cache.enabled:
+        cached = watch_state_cache.get(cache_key, fingerprint)
+        inc("watch_state_cache_total", result="hit" if cached else "miss")
+        if cached is not None:
+            return cached, True
 
     # 2. 调用你的风险路由器
     raw_result = router.route(state)
 
     # 3. 用你原来的函数构造 payload（就是之前 print 出来的那种）
-    output_payload = build_mqtt_payload(raw_result, state)
+    with span("payload_build"):
+        output_payload = build_mqtt_payload(raw_result, state, router.reminder_manager)
 
     # 4. 保持原行为：照常发给 MQTT / 其它下游
     try:
@@ -142,12 +183,64 @@ def get_watch_state(
 
     # 5. 前端专用结构：一层包起来
     engine_payload = {
-        "user_name": "王淑珍",   # TODO：以后可以从用户配置表里查
+        "user_name": user_name,
         "state": state,
         "output": output_payload,
     }
 
-    return engine_payload
+    # 路由本身可能写入提醒（宏），以写入后的代数作为缓存指纹
+    fingerprint = state_fingerprint(state, (router.reminder_manager.cache.token(user_id), user_name))
+    entry = watch_state_cache.put(cache_key, fingerprint, engine_payload)
+    return entry, False
+
+
+@app.get("/api/watch_state", response_class=JSONBytesResponse)
+@profiled
+def get_watch_state(
+    user_id: str = "user_001",
+    scenario: str = "live",   # 新增参数：live / high / medium / low
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    调用方式示例：
+      实时数据： http://localhost:8000/api/watch_state?user_id=user_001
+      high demo: http://localhost:8000/api/watch_state?user_id=user_001&scenario=high
+      low  demo: http://localhost:8000/api/watch_state?user_id=user_001&scenario=low
+    带上次响应的 ETag 作为 If-None-Match 时，未变化返回 304（无响应体）。
+    """
+    entry, cache_hit = compute_watch_state(user_id, scenario)
+    headers = {"ETag": entry.etag, "X-Cache": "hit" if cache_hit else "miss"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    # 响应体在写入缓存时已序列化一次，这里原样发送
+    return JSONBytesResponse(entry.body, headers=headers)
+
+
+# ======== 生命体征历史：趋势图 / 审计 ========
+@app.get("/api/vitals", response_class=JSONBytesResponse)
+def get_vitals(
+    device_id: str = "user_001",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: str = "auto",   # auto / raw / 1m / 1h
+    limit: int = 5000,
+):
+    """
+    start / end 为 epoch 秒（默认最近 1 小时）；auto 按跨度自动选原始或聚合层。
+    示例： http://localhost:8000/api/vitals?device_id=watch_alpha_01&resolution=1m
+    """
+    try:
+        return JSONBytesResponse(get_vitals_store().query(device_id, start, end, resolution, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ======== Prometheus 抓取接口 ========
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
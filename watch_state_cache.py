@@ -0,0 +1,80 @@
+"""
+/api/watch_state 的按用户结果缓存。
+
+指纹 = state 去掉 timestamp 后的规范化 JSON 哈希（再加上提醒写代数，提醒状态变化时自动失效）。
+同一用户的传感器样本与天气快照没有变化时，直接复用上一次的 payload：
+不重新路由、不写短期记忆、不重复推送 llmoutput，连响应体都是缓存的已序列化 bytes；
+ETag 即指纹，支持 If-None-Match / 304。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from config import WATCH_STATE_CACHE_TTL
+from serialization import dumps_bytes
+
+VOLATILE_STATE_KEYS = ("timestamp",)
+
+
+def state_fingerprint(state: Dict[str, Any], extra: Any = None) -> str:
+    stable = {k: v for k, v in state.items() if k not in VOLATILE_STATE_KEYS}
+    return hashlib.sha256(dumps_bytes([stable, extra], sort_keys=True)).hexdigest()[:32]
+
+
+def etag_for(fingerprint: str) -> str:
+    return f'W/"{fingerprint}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # 弱比较：W/"x" 与 "x" 视为相同
+    strong = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or etag in candidates or strong in candidates
+
+
+@dataclass
+class CachedWatchState:
+    fingerprint: str
+    payload: Dict[str, Any]
+    body: bytes   # payload 序列化后的 JSON，命中时直接作为响应体
+    stored_at: float
+
+    @property
+    def etag(self) -> str:
+        return etag_for(self.fingerprint)
+
+
+class WatchStateCache:
+    def __init__(self, ttl: float = WATCH_STATE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], CachedWatchState] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Tuple[str, str], fingerprint: str) -> Optional[CachedWatchState]:
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = (
+                entry is not None
+                and entry.fingerprint == fingerprint
+                and time.monotonic() - entry.stored_at < self.ttl
+            )
+            self.stats["hits" if hit else "misses"] += 1
+            return entry if hit else None
+
+    def put(self, key: Tuple[str, str], fingerprint: str, payload: Dict[str, Any]) -> CachedWatchState:
+        entry = CachedWatchState(fingerprint, payload, dumps_bytes(payload), time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+        return entry